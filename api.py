@@ -0,0 +1,305 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import numpy as np
+from flask import Flask, g, jsonify, request
+from werkzeug.serving import BaseWSGIServer
+
+from utils import (
+    DATASET_PATH, KEY_COLUMN, load_and_process_data, search_restaurants, get_restaurant_recommendations,
+    get_query_cache_stats, get_dataset_metadata, apply_dataset_updates, get_similar_restaurants,
+    text_search_restaurants, autocomplete
+)
+from ml_utils import MODEL_PATH, get_model_manager
+from batching_utils import ModelNotReadyError, PredictionBatcher
+from serving_utils import preload, process_memory, serve_forked
+import metrics_utils
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server handing each connection to a fixed pool of worker threads
+    """
+    def __init__(self, host, port, app, workers=16):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+# Accepted values of the Yes/No service flags of a prediction record
+FLAG_VALUES = ('Yes', 'No', True, False)
+
+def _prediction_records(payload):
+    """
+    Convert one or more JSON restaurant records into predictor input records
+    """
+    records = payload if isinstance(payload, list) else [payload]
+    if not records or not all(isinstance(record, dict) for record in records):
+        raise ValueError("Request body must be a JSON restaurant record or a list of records")
+
+    missing = [
+        i for i, record in enumerate(records)
+        if not isinstance(record.get('cuisines'), str) or not record['cuisines'].strip()
+        or not isinstance(record.get('city'), str) or not record['city'].strip()
+    ]
+    if missing:
+        raise ValueError(f"Records {missing} need 'cuisines' and 'city' strings")
+
+    converted = []
+    for i, record in enumerate(records):
+        cost = record.get('cost', 50)
+        if isinstance(cost, bool) or not isinstance(cost, (int, float)):
+            raise ValueError(f"Record {i}: 'cost' must be a number")
+        flags = [record.get(field, 'No') for field in ('has_table_booking', 'has_online_delivery')]
+        if any(flag not in FLAG_VALUES for flag in flags):
+            raise ValueError(f"Record {i}: 'has_table_booking' and 'has_online_delivery' must be 'Yes' or 'No'")
+        converted.append({
+            'Cuisines': record['cuisines'],
+            'City': record['city'],
+            'Average Cost for two': float(cost),
+            'Has Table booking': flags[0],
+            'Has Online delivery': flags[1]
+        })
+    return converted
+
+def create_app(dataset_path=DATASET_PATH, model_path=MODEL_PATH, batch_max_size=64, batch_max_wait_ms=2.0,
+               accept_updates=True):
+    """
+    Create the JSON API sharing the Streamlit app's data and model
+
+    Concurrent /predict requests are coalesced into batches of up to
+    batch_max_size records, waiting at most batch_max_wait_ms for more;
+    batch_max_size=1 predicts every request on its own.
+
+    With accept_updates=False, POST /updates is refused: forked workers
+    each hold their own copy of the dataset and model, so an update would
+    only reach the worker that received it.
+    """
+    app = Flask(__name__)
+
+    # Load the dataset and start loading or training the model at startup
+    model_manager = get_model_manager(model_path)
+    model_manager.get(load_and_process_data(dataset_path))
+
+    def get_data():
+        # Cheap after startup: the dataset and model are cached process-wide;
+        # the predictor is None while the first model is still training
+        df = load_and_process_data(dataset_path)
+        return df, model_manager.get(df)
+
+    batcher = None
+    if batch_max_size > 1:
+        batcher = PredictionBatcher(lambda: get_data()[1], batch_max_size, batch_max_wait_ms)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = metrics_utils.start_timer()
+
+    @app.teardown_request
+    def stop_request_timer(error=None):
+        started = g.pop('request_started', None)
+        if started is not None and request.endpoint:
+            metrics_utils.stop_timer(f"api.{request.endpoint}", started)
+            metrics_utils.increment('api.errors' if error is not None else 'api.requests')
+
+    @app.errorhandler(ValueError)
+    def handle_bad_request(error):
+        return jsonify({'error': str(error)}), 400
+
+    @app.get("/health")
+    def health():
+        df, predictor = get_data()
+        return jsonify({
+            'status': 'ok',
+            'restaurants': get_dataset_metadata(df)['restaurants'],
+            'model_status': model_manager.status,
+            'model_accuracy': predictor.val_score if predictor is not None else None,
+            'query_cache': get_query_cache_stats(),
+            'prediction_batching': batcher.stats() if batcher is not None else None,
+            'process': {'pid': os.getpid(), 'memory': process_memory()}
+        })
+
+    @app.get("/metrics")
+    def metrics():
+        # Stage timings and counters; empty unless instrumentation is enabled
+        snapshot = metrics_utils.snapshot()
+        snapshot['query_cache'] = get_query_cache_stats()
+        snapshot['model_status'] = model_manager.status
+        return jsonify(snapshot)
+
+    @app.get("/autocomplete")
+    def suggest():
+        field = request.args.get('field', 'cuisine')
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+        df, _ = get_data()
+        return jsonify({'suggestions': autocomplete(df, field, request.args.get('prefix', ''), limit)})
+
+    @app.get("/search")
+    def search():
+        cuisine = request.args.get('cuisine', '').strip()
+        text = request.args.get('q', '').strip()
+        if not cuisine and not text:
+            raise ValueError("Query parameter 'cuisine' or 'q' is required")
+
+        page = request.args.get('page', 1, type=int)
+        page_size = min(request.args.get('page_size', 50, type=int), 500)
+        sort_by = request.args.get('sort') or None
+        city = request.args.get('city', '').strip() or None
+        if page < 1 or page_size < 1:
+            raise ValueError("'page' and 'page_size' must be positive")
+
+        df, _ = get_data()
+        if text:
+            results = text_search_restaurants(df, text, page_size=page_size, city=city)
+        else:
+            results = search_restaurants(df, cuisine, page_size=page_size, sort_by=sort_by, city=city)
+        return jsonify({
+            'count': results.total,
+            'page': page,
+            'pages': results.n_pages,
+            'results': results.page(page - 1).to_dict(orient='records')
+        })
+
+    @app.post("/recommend")
+    def recommend():
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object of preferences")
+        preferred_cuisines = payload.get('preferred_cuisines')
+        if not preferred_cuisines or not isinstance(preferred_cuisines, list):
+            raise ValueError("'preferred_cuisines' must be a non-empty list")
+
+        # Types are checked by get_restaurant_recommendations
+        preferences = {
+            'preferred_cuisines': preferred_cuisines,
+            'max_budget': payload.get('max_budget', float('inf')),
+            'min_rating': payload.get('min_rating', 0),
+            'city': payload.get('city')
+        }
+        df, _ = get_data()
+        recommendations = get_restaurant_recommendations(df, preferences)
+        return jsonify({'results': recommendations.to_dict(orient='records')})
+
+    @app.get("/similar")
+    def similar():
+        df, _ = get_data()
+        if 'id' in request.args:
+            if KEY_COLUMN not in df.columns:
+                raise ValueError(f"The dataset has no '{KEY_COLUMN}' column; use 'position'")
+            key = request.args.get('id', type=int)
+            if key is None:
+                raise ValueError("'id' must be an integer")
+            matches = np.flatnonzero(df[KEY_COLUMN].to_numpy() == key)
+            if len(matches) == 0:
+                return jsonify({'error': f"No restaurant with id {request.args['id']}"}), 404
+            position = int(matches[-1])
+        elif 'position' in request.args:
+            position = request.args.get('position', type=int)
+        else:
+            raise ValueError("Query parameter 'id' or 'position' is required")
+
+        top_k = min(request.args.get('k', 10, type=int), 100)
+        same_city = request.args.get('same_city', '').lower() in ('1', 'true', 'yes')
+        if position is None or not 0 <= position < len(df) or top_k < 1:
+            raise ValueError("'position' must be a row of the dataset and 'k' positive")
+
+        results = get_similar_restaurants(df, position, top_k=top_k, same_city=same_city)
+        return jsonify({'position': position, 'results': results.to_dict(orient='records')})
+
+    @app.post("/predict")
+    def predict():
+        payload = request.get_json(silent=True)
+        if not payload:
+            raise ValueError("Request body must be a JSON restaurant record or a list of records")
+
+        records = _prediction_records(payload)
+        _, predictor = get_data()
+        if predictor is None:
+            return jsonify({'error': model_manager.error or "Rating model is warming up"}), 503
+        if batcher is None:
+            predictions = predictor.predict_fast(records)
+        else:
+            try:
+                predictions = batcher.predict_sync(records)
+            except ModelNotReadyError as e:
+                return jsonify({'error': model_manager.error or str(e)}), 503
+        return jsonify({'predictions': [round(float(p), 3) for p in predictions]})
+
+    @app.post("/updates")
+    def updates():
+        if not accept_updates:
+            return jsonify({
+                'error': "Updates are disabled with --processes > 1, since each worker process would only "
+                         "update its own copy; run a single process or update the dataset file and restart"
+            }), 409
+
+        payload = request.get_json(silent=True)
+        records = payload if isinstance(payload, list) else [payload] if payload else []
+        if not records or any(not isinstance(r, dict) or KEY_COLUMN not in r for r in records):
+            raise ValueError(f"Request body must be a list of restaurant records with '{KEY_COLUMN}'")
+
+        start = time.perf_counter()
+        df = apply_dataset_updates(pd.DataFrame.from_records(records), dataset_path)
+        model_refreshed = model_manager.apply_update(df)
+        return jsonify({
+            'restaurants': get_dataset_metadata(df)['restaurants'],
+            'model_refreshed': model_refreshed,
+            'seconds': round(time.perf_counter() - start, 4)
+        })
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve restaurant search, recommendations and rating predictions over HTTP")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=16, help="Number of request worker threads per process")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Number of forked worker processes sharing one copy of the dataset and model")
+    parser.add_argument("--batch-max-size", type=int, default=64,
+                        help="Most records predicted in one batch of concurrent /predict requests (1 disables batching)")
+    parser.add_argument("--batch-max-wait-ms", type=float, default=2.0,
+                        help="Longest a /predict request waits for others to join its batch")
+    parser.add_argument("--metrics", action="store_true", help="Record stage timings for GET /metrics")
+    parser.add_argument("--trace-memory", action="store_true", help="Also trace memory allocations (slower)")
+    args = parser.parse_args()
+
+    if args.metrics or args.trace_memory:
+        metrics_utils.enable(trace_memory=args.trace_memory)
+
+    if args.processes > 1:
+        # Load once in the parent; forked workers share it copy-on-write
+        preload()
+
+    app = create_app(
+        batch_max_size=args.batch_max_size,
+        batch_max_wait_ms=args.batch_max_wait_ms,
+        accept_updates=args.processes == 1
+    )
+    server = PooledWSGIServer(args.host, args.port, app, workers=args.workers)
+    print(f"Serving on http://{args.host}:{args.port} with {args.processes} x {args.workers} workers")
+    if args.processes > 1:
+        serve_forked(server, args.processes)
+        return
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
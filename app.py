@@ -1,8 +1,31 @@
+import json
+
 import streamlit as st
 import pandas as pd
-from utils import load_and_process_data, filter_restaurants, get_restaurant_recommendations
+from utils import (
+    load_and_process_data, search_restaurants, get_restaurant_recommendations, get_dataset_metadata,
+    get_similar_restaurants, text_search_restaurants, autocomplete
+)
 from styles import apply_custom_styles
-from ml_utils import RestaurantRatingPredictor
+from ml_utils import get_model_manager
+import metrics_utils
+
+# Search results shown per page
+RESULTS_PAGE_SIZE = 50
+
+# City filter option searching every city
+ALL_CITIES = "All cities"
+
+# Search modes
+CUISINE_SEARCH = "Cuisine"
+TEXT_SEARCH = "Name, address or cuisine"
+
+# Search sort options: label -> search_restaurants sort key
+SORT_OPTIONS = {
+    "Default": None,
+    "Highest rated": "rating",
+    "Lowest cost": "cost"
+}
 
 # Page configuration
 st.set_page_config(
@@ -12,19 +35,29 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Time the whole rerun when instrumentation is enabled
+rerun_started = metrics_utils.start_timer()
+
 try:
     # Apply custom styles
     apply_custom_styles()
 
     # Load and process data
-    df = load_and_process_data()
-
-    # Initialize ML model
-    if 'rating_predictor' not in st.session_state:
-        st.session_state.rating_predictor = RestaurantRatingPredictor()
-        with st.spinner('Training rating prediction model...'):
-            val_score = st.session_state.rating_predictor.fit(df)
-            st.session_state.model_accuracy = val_score
+    with metrics_utils.timer('app.load_data'):
+        df = load_and_process_data()
+        metadata = get_dataset_metadata(df)
+
+        # Cuisine and city suggestions shared by every form, most common first;
+        # prebuilt with the dataset's prefix index, so nothing is sorted per rerun
+        all_cuisines = [suggestion['value'] for suggestion in autocomplete(df, 'cuisine', limit=None)]
+        all_cities = [suggestion['value'] for suggestion in autocomplete(df, 'city', limit=None)]
+        city_options = [ALL_CITIES] + all_cities
+
+    # Rating model: loaded from disk or trained in a background process, never
+    # on this rerun; None until the first model is ready
+    with metrics_utils.timer('app.load_model'):
+        model_manager = get_model_manager()
+        rating_predictor = model_manager.get(df)
 
     # Sidebar for search history
     with st.sidebar:
@@ -38,9 +71,13 @@ try:
 
         st.markdown("---")
         st.markdown("### 📊 Quick Stats")
-        st.markdown(f"Total Restaurants: **{len(df)}**")
-        st.markdown(f"Cuisines Available: **{len(set(df['Cuisines'].str.split(',').sum()))}**")
-        st.markdown(f"Cities Covered: **{len(df['City'].unique())}**")
+        st.markdown(f"Total Restaurants: **{metadata['restaurants']}**")
+        st.markdown(f"Cuisines Available: **{len(metadata['cuisine_vocab'])}**")
+        st.markdown(f"Cities Covered: **{len(metadata['city_counts'])}**")
+
+        with st.expander("Rating distribution"):
+            rating_counts, rating_edges = metadata['rating_histogram']
+            st.bar_chart(pd.Series(rating_counts, index=[f"{edge:.1f}" for edge in rating_edges[:-1]]))
 
     # Main content
     st.title("🍽️ Restaurant Finder & Recommender")
@@ -62,42 +99,78 @@ try:
         st.markdown("""
             <div style='background-color: #FFF5F5; padding: 1rem; border-radius: 10px; margin-bottom: 2rem;'>
                 <h3 style='margin: 0; color: #FF4B4B;'>Find Your Favorite Cuisine</h3>
-                <p style='margin: 0.5rem 0 0 0;'>Search through our extensive database of restaurants by cuisine type.</p>
+                <p style='margin: 0.5rem 0 0 0;'>Search through our extensive database of restaurants by cuisine type, name or address.</p>
             </div>
         """, unsafe_allow_html=True)
 
-        # Get unique cuisines for autocomplete
-        all_cuisines = set()
-        for cuisines in df['Cuisines'].str.split(','):
-            if isinstance(cuisines, list):
-                all_cuisines.update([c.strip() for c in cuisines])
-        all_cuisines = sorted(list(all_cuisines))
-
         # Search interface
-        col1, col2 = st.columns([3, 1])
+        search_mode = st.radio(
+            "Search by", options=[CUISINE_SEARCH, TEXT_SEARCH], horizontal=True, label_visibility="collapsed"
+        )
+        col1, col2, col3 = st.columns([3, 2, 1])
         with col1:
-            cuisine_type = st.selectbox(
-                "What cuisine are you craving today?",
-                options=all_cuisines,
-                index=None,
-                placeholder="Choose a cuisine..."
-            )
+            if search_mode == CUISINE_SEARCH:
+                search_input = st.selectbox(
+                    "What cuisine are you craving today?",
+                    options=all_cuisines,
+                    index=None,
+                    placeholder="Choose a cuisine..."
+                )
+            else:
+                search_input = st.text_input(
+                    "What are you looking for?",
+                    placeholder="e.g. Pizza near Connaught Place",
+                    help="Search restaurant names, addresses and cuisines; typos are fine"
+                ).strip()
         with col2:
+            search_city = st.selectbox("In which city?", options=city_options)
+        with col3:
             search_button = st.button("Search Restaurants", type="primary")
 
-        if cuisine_type and search_button:
-            if cuisine_type not in st.session_state.search_history:
-                st.session_state.search_history.append(cuisine_type)
+        # Free text searches also run when Enter is pressed in the text box
+        if search_input and (search_button or (search_mode == TEXT_SEARCH and search_input != st.session_state.get('search_query'))):
+            if search_input not in st.session_state.search_history:
+                st.session_state.search_history.append(search_input)
+            # Keep the query so paging and sorting reruns show the same search
+            st.session_state.search_query = search_input
+            st.session_state.search_query_mode = search_mode
+            st.session_state.search_city = None if search_city == ALL_CITIES else search_city
+            st.session_state.search_page = 1
+
+        search_query = st.session_state.get('search_query')
+        search_city = st.session_state.get('search_city')
+        location = f" in {search_city}" if search_city else ""
+        text_query = st.session_state.get('search_query_mode') == TEXT_SEARCH
+        description = f"matching '{search_query}'" if text_query else f"serving {search_query} cuisine"
+        if search_query:
+            col1, col2 = st.columns(2)
+            with col1:
+                if not text_query:
+                    sort_label = st.selectbox("Sort results by", options=list(SORT_OPTIONS), key='search_sort')
 
             with st.spinner('🔍 Searching for the best restaurants...'):
-                results = filter_restaurants(df, cuisine_type)
+                if text_query:
+                    results = text_search_restaurants(df, search_query, page_size=RESULTS_PAGE_SIZE, city=search_city)
+                else:
+                    results = search_restaurants(
+                        df, search_query, page_size=RESULTS_PAGE_SIZE, sort_by=SORT_OPTIONS[sort_label],
+                        city=search_city
+                    )
 
-                if isinstance(results, str):
-                    st.warning(results)
+                if results.total == 0:
+                    st.warning(f"No restaurants found {description}{location}.")
                 else:
-                    st.success(f"🎉 Found {len(results)} amazing restaurants serving {cuisine_type} cuisine!")
+                    with col2:
+                        page = st.number_input(
+                            f"Page (of {results.n_pages})",
+                            min_value=1,
+                            max_value=results.n_pages,
+                            key='search_page'
+                        )
+                    st.success(f"🎉 Found {results.total} amazing restaurants {description}{location}!")
+                    page_results = results.page(page - 1)
                     st.dataframe(
-                        results,
+                        page_results,
                         column_config={
                             "Restaurant Name": st.column_config.TextColumn("Restaurant Name", width="medium"),
                             "Cuisines": st.column_config.TextColumn("Cuisines", width="large"),
@@ -108,6 +181,34 @@ try:
                         hide_index=True,
                     )
 
+                    # "More like this" for any restaurant on the page; the frame index is the row position
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        similar_to = st.selectbox(
+                            "Find restaurants similar to...",
+                            options=list(page_results.index),
+                            format_func=lambda position: f"{page_results.at[position, 'Restaurant Name']} ({page_results.at[position, 'Address']})",
+                            index=None,
+                            placeholder="Choose a restaurant..."
+                        )
+                    with col2:
+                        similar_same_city = st.checkbox("Same city only", value=True)
+
+                    if similar_to is not None:
+                        similar = get_similar_restaurants(df, similar_to, same_city=similar_same_city)
+                        st.dataframe(
+                            similar,
+                            column_config={
+                                "Restaurant Name": st.column_config.TextColumn("Restaurant Name", width="medium"),
+                                "Cuisines": st.column_config.TextColumn("Cuisines", width="large"),
+                                "Address": st.column_config.TextColumn("Address", width="large"),
+                                "Cost": st.column_config.TextColumn("Average Cost", width="small"),
+                                "Rating": st.column_config.TextColumn("Rating", width="small"),
+                                "Similarity": st.column_config.ProgressColumn("Similarity", min_value=0, max_value=1, width="small")
+                            },
+                            hide_index=True,
+                        )
+
     # Tab 2: Personalized Recommendations
     with tab2:
         st.markdown("""
@@ -126,6 +227,12 @@ try:
                 help="Choose one or more cuisines you love"
             )
 
+            preferred_city = st.selectbox(
+                "Where do you want to eat?",
+                options=city_options,
+                help="Only recommend restaurants in this city"
+            )
+
             col1, col2 = st.columns(2)
             with col1:
                 max_budget = st.number_input(
@@ -151,7 +258,8 @@ try:
             preferences = {
                 'preferred_cuisines': preferred_cuisines,
                 'max_budget': max_budget,
-                'min_rating': min_rating
+                'min_rating': min_rating,
+                'city': None if preferred_city == ALL_CITIES else preferred_city
             }
 
             with st.spinner('🔍 Finding your perfect restaurants...'):
@@ -182,16 +290,23 @@ try:
 
         col1, col2 = st.columns([2, 1])
         with col1:
-            st.info(f"🎯 Model Accuracy: {st.session_state.model_accuracy:.2%}")
+            if rating_predictor is not None:
+                st.info(f"🎯 Model Accuracy: {rating_predictor.val_score:.2%}")
+            elif model_manager.error:
+                st.error(model_manager.error)
+            else:
+                st.info("⏳ The rating prediction model is warming up. Predictions will be available shortly.")
 
         with st.form("prediction_form"):
             st.markdown("### Restaurant Details")
 
             col1, col2 = st.columns(2)
             with col1:
-                cuisines = st.text_input(
+                cuisines = st.multiselect(
                     "What cuisines will be served?",
-                    help="Enter cuisines, e.g., 'Italian, Pizza'"
+                    options=all_cuisines,
+                    placeholder="Start typing a cuisine...",
+                    help="Choose the main cuisine first, e.g. italian, pizza"
                 )
                 cost = st.number_input(
                     "Average cost for two",
@@ -199,9 +314,12 @@ try:
                     value=50,
                     help="Enter the average cost for two people"
                 )
-                city = st.text_input(
+                city = st.selectbox(
                     "Which city is the restaurant in?",
-                    help="Enter the city name"
+                    options=all_cities,
+                    index=None,
+                    placeholder="Start typing a city...",
+                    help="Choose the city of the restaurant"
                 )
 
             with col2:
@@ -218,17 +336,19 @@ try:
 
             predict_button = st.form_submit_button("Predict Rating", type="primary")
 
-        if predict_button and cuisines and city:
-            pred_data = pd.DataFrame({
-                'Cuisines': [cuisines],
-                'City': [city],
-                'Average Cost for two': [cost],
-                'Has Table booking': [has_table],
-                'Has Online delivery': [has_online]
-            })
+        if predict_button and rating_predictor is None:
+            st.warning("The rating prediction model is not ready yet. Please try again in a moment.")
+        elif predict_button and cuisines and city:
+            pred_data = {
+                'Cuisines': ', '.join(cuisines),
+                'City': city,
+                'Average Cost for two': cost,
+                'Has Table booking': has_table,
+                'Has Online delivery': has_online
+            }
 
             with st.spinner('🤔 Analyzing restaurant details...'):
-                predicted_rating = st.session_state.rating_predictor.predict(pred_data)[0]
+                predicted_rating = rating_predictor.predict_fast(pred_data)[0]
 
                 st.markdown("""
                     <div style='background-color: #D4EDDA; padding: 1rem; border-radius: 10px; margin: 1rem 0;'>
@@ -261,6 +381,30 @@ try:
         </div>
     """, unsafe_allow_html=True)
 
+    metrics_utils.stop_timer('app.rerun', rerun_started)
+
+    # Hidden diagnostics panel, opened by adding ?diagnostics=1 to the URL.
+    # It is read-only: instrumentation is process-wide and can slow every
+    # session, so only the server's environment (RESTAURANT_METRICS) turns it on
+    if st.query_params.get('diagnostics') == '1':
+        with st.sidebar:
+            st.markdown("---")
+            st.markdown("### 🩺 Diagnostics")
+            if not metrics_utils.ENABLED:
+                st.info("Instrumentation is off. Start the app with RESTAURANT_METRICS=1 to record metrics.")
+            else:
+                snapshot = metrics_utils.snapshot()
+                if snapshot['stages']:
+                    st.dataframe(pd.DataFrame(snapshot['stages']).T[['count', 'mean_ms', 'p99_ms', 'max_ms']])
+                st.json(snapshot['counters'])
+                if snapshot['memory'] is not None:
+                    st.markdown(f"Traced memory: **{snapshot['memory']['current_mb']} MB** (peak {snapshot['memory']['peak_mb']} MB)")
+                    st.dataframe(pd.DataFrame(snapshot['memory']['top_allocations']), hide_index=True)
+                st.download_button(
+                    "Download metrics", data=json.dumps(snapshot, indent=2),
+                    file_name="metrics.json", mime="application/json"
+                )
+
 except Exception as e:
     st.error(f"An error occurred: {str(e)}")
     st.info("Please make sure all required data and dependencies are properly set up.")
\ No newline at end of file
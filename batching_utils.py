@@ -0,0 +1,177 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from metrics_utils import increment, timer
+
+class ModelNotReadyError(RuntimeError):
+    pass
+
+async def _cancel(task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+class PredictionBatcher:
+    """
+    Coalesce concurrent rating prediction requests into batched calls
+
+    Each request (one or more predictor input records) is queued; a single
+    consumer takes the first waiting request, gathers more for at most
+    max_wait_ms or until max_batch_size records are collected, and runs
+    them as one predict_fast() call in a worker thread. Requests that
+    arrive while a batch is being predicted form the next batch, so
+    batches grow with load while a lone request waits at most max_wait_ms.
+    No batch holds more than max_batch_size records: larger requests are
+    split, and a request that would overflow a batch starts the next one.
+
+    get_predictor is called for every batch, so a hot-swapped model is
+    picked up at once; it may return None while no model is ready.
+
+    Async callers await predict(); threaded callers (e.g. WSGI handlers)
+    use predict_sync(), which runs the batcher on its own event loop
+    thread, started on first use so it is never inherited by fork().
+    A batcher must only be used from one event loop.
+    """
+    def __init__(self, get_predictor, max_batch_size=64, max_wait_ms=2.0):
+        self.get_predictor = get_predictor
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0) / 1000
+        self.batches = 0
+        self.predicted_rows = 0
+        self._queue = None
+        self._consumer = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    async def predict(self, records):
+        """
+        Predicted ratings for a list of predictor input records
+        """
+        if len(records) > self.max_batch_size:
+            parts = [
+                records[start:start + self.max_batch_size]
+                for start in range(0, len(records), self.max_batch_size)
+            ]
+            return np.concatenate(await asyncio.gather(*(self.predict(part) for part in parts)))
+
+        if self._consumer is None:
+            self._queue = asyncio.Queue()
+            self._consumer = asyncio.get_running_loop().create_task(self._consume())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((records, future))
+        return await future
+
+    def predict_sync(self, records, timeout=None):
+        """
+        predict() for callers outside an event loop; blocks until done
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="prediction-batcher", daemon=True
+                ).start()
+        return asyncio.run_coroutine_threadsafe(self.predict(records), self._loop).result(timeout)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        # Request held back because it did not fit in the previous batch
+        pending = None
+        while True:
+            batch = [pending if pending is not None else await self._queue.get()]
+            pending = None
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+
+            while size < self.max_batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                if size + len(item[0]) > self.max_batch_size:
+                    pending = item
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            try:
+                await self._run_batch(batch)
+            except Exception as e:
+                # Never leave callers waiting, and keep consuming
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _run_batch(self, batch):
+        # Drop requests whose callers stopped waiting
+        batch = [(records, future) for records, future in batch if not future.done()]
+        if not batch:
+            return
+
+        predictor = self.get_predictor()
+        if predictor is None:
+            for _, future in batch:
+                future.set_exception(ModelNotReadyError("Rating model is warming up"))
+            return
+
+        loop = asyncio.get_running_loop()
+        records = [r for request_records, _ in batch for r in request_records]
+        try:
+            with timer('predict_batcher.batch'):
+                predictions = await loop.run_in_executor(None, predictor.predict_fast, records)
+        except Exception:
+            # Predict requests one by one so only the bad ones fail
+            for request_records, future in batch:
+                try:
+                    result = await loop.run_in_executor(None, predictor.predict_fast, request_records)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self._count_batch(len(request_records))
+                    if not future.done():
+                        future.set_result(result)
+            return
+
+        self._count_batch(len(records))
+
+        offset = 0
+        for request_records, future in batch:
+            if not future.done():
+                future.set_result(predictions[offset:offset + len(request_records)])
+            offset += len(request_records)
+
+    def _count_batch(self, rows):
+        self.batches += 1
+        self.predicted_rows += rows
+        increment('predict_batcher.batches')
+        increment('predict_batcher.rows', rows)
+
+    def close(self):
+        """
+        Stop the consumer and the batcher's own event loop, if any
+        """
+        consumer, self._consumer = self._consumer, None
+        loop, self._loop = self._loop, None
+        if loop is not None:
+            if consumer is not None:
+                asyncio.run_coroutine_threadsafe(_cancel(consumer), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        elif consumer is not None:
+            consumer.get_loop().call_soon_threadsafe(consumer.cancel)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'predicted_rows': self.predicted_rows,
+            'mean_batch_size': self.predicted_rows / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }
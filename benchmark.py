@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+import numpy as np
+import sklearn
+
+from utils import (
+    DATASET_PATH, REQUIRED_COLUMNS, KEY_COLUMN, load_and_process_data, clear_dataset_cache,
+    clear_query_cache, filter_restaurants, search_restaurants, get_restaurant_recommendations,
+    get_batch_recommendations, get_dataset_metadata
+)
+from ml_utils import RestaurantRatingPredictor
+
+# Catalog sizes accepted by --sizes: label -> rows
+CATALOG_SIZES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000
+}
+
+# Rows generated and written per chunk, bounding memory for large catalogs
+GENERATE_CHUNK_ROWS = 500_000
+
+def _parse_size(label):
+    label = label.strip().lower()
+    if label in CATALOG_SIZES:
+        return CATALOG_SIZES[label]
+    return int(label)
+
+def generate_catalog(path, rows, seed=42, source_path=DATASET_PATH):
+    """
+    Write a synthetic restaurant catalog CSV of the given size
+
+    Cities, currencies, cuisines, booking flags and the joint distribution of
+    cost and rating are resampled from the bundled dataset, so cuisine and
+    city frequencies and per-city prices stay realistic. Costs and ratings
+    get some noise, and names, addresses and IDs are unique per row.
+    """
+    source = pd.read_csv(source_path, usecols=lambda column: column in REQUIRED_COLUMNS)
+    rng = np.random.default_rng(seed)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    for start in range(0, rows, GENERATE_CHUNK_ROWS):
+        n = min(GENERATE_CHUNK_ROWS, rows - start)
+        chunk = source.iloc[rng.integers(0, len(source), n)].reset_index(drop=True)
+        ids = np.arange(start + 1, start + n + 1)
+
+        chunk.insert(0, KEY_COLUMN, ids)
+        chunk['Restaurant Name'] = 'Restaurant ' + pd.Series(ids).astype(str)
+        chunk['Address'] = pd.Series(rng.integers(1, 1000, n)).astype(str) + ' Main Street, ' + chunk['City'].astype(str)
+
+        # Keep unrated restaurants unrated, jitter the others
+        cost_noise = rng.lognormal(0, 0.25, n)
+        chunk['Average Cost for two'] = np.round(chunk['Average Cost for two'].to_numpy() * cost_noise, -1)
+        ratings = chunk['Aggregate rating'].to_numpy(dtype=np.float64)
+        jittered = np.clip(np.round(ratings + rng.normal(0, 0.2, n), 1), 1.0, 4.9)
+        chunk['Aggregate rating'] = np.where(ratings > 0, jittered, ratings)
+
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+    os.replace(tmp_path, path)
+    return path
+
+def _catalog_path(data_dir, rows, seed):
+    return os.path.join(data_dir, f"catalog-{rows}-{seed}.csv")
+
+def _percentile_ms(latencies, q):
+    return round(float(np.percentile(latencies, q)) * 1000, 3)
+
+def measure(operation, rows, call, repeats, setup=None, track_memory=True):
+    """
+    Time repeats calls of call() and report latency percentiles, throughput
+    and peak traced memory
+
+    setup(), when given, runs untimed before every call, e.g. to clear
+    caches. Memory is traced on one extra call so the timed calls do not pay
+    for tracemalloc.
+    """
+    latencies = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if track_memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            call()
+            peak_mb = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+
+    result = {
+        'operation': operation,
+        'rows': rows,
+        'repeats': repeats,
+        'mean_ms': round(float(np.mean(latencies)) * 1000, 3),
+        'p50_ms': _percentile_ms(latencies, 50),
+        'p90_ms': _percentile_ms(latencies, 90),
+        'p99_ms': _percentile_ms(latencies, 99),
+        'max_ms': _percentile_ms(latencies, 100),
+        'throughput_per_s': round(repeats / sum(latencies), 3) if sum(latencies) else None,
+        'peak_memory_mb': peak_mb
+    }
+    print(f"{rows:>10} {operation:<45} p50 {result['p50_ms']:>10.3f} ms  p99 {result['p99_ms']:>10.3f} ms  "
+          f"peak {peak_mb if peak_mb is not None else '-':>8} MB")
+    return result
+
+def run_catalog(path, rows, queries=200, load_repeats=3, fit_rows=100_000, n_estimators=100,
+                track_memory=True, seed=42):
+    """
+    Benchmark every hot path on one catalog and return the result records
+    """
+    rng = random.Random(seed)
+    results = []
+
+    results.append(measure(
+        'load_and_process_data:first', rows, lambda: load_and_process_data(path), 1,
+        setup=clear_dataset_cache, track_memory=False
+    ))
+    results.append(measure(
+        'load_and_process_data:cold', rows, lambda: load_and_process_data(path), load_repeats,
+        setup=clear_dataset_cache, track_memory=track_memory
+    ))
+    results.append(measure(
+        'load_and_process_data:cached', rows, lambda: load_and_process_data(path), queries,
+        track_memory=track_memory
+    ))
+
+    df = load_and_process_data(path)
+    metadata = get_dataset_metadata(df)
+    # Query the popular cuisines and cities the way users do
+    cuisines = list(metadata['cuisine_counts'].index[:50])
+    cities = list(metadata['city_counts'].index[:20])
+
+    def profile():
+        return {
+            'preferred_cuisines': rng.sample(cuisines, rng.randint(1, 3)),
+            'max_budget': rng.choice([100, 500, 1000, 2000]),
+            'min_rating': rng.choice([0, 3.0, 3.5, 4.0])
+        }
+
+    def each(make_args, call):
+        # A different random query for every timed call and the memory pass
+        args = iter([make_args() for _ in range(queries + 1)])
+        return lambda: call(*next(args))
+
+    results.append(measure(
+        'filter_restaurants', rows,
+        each(lambda: (rng.choice(cuisines),), lambda cuisine: filter_restaurants(df, cuisine)),
+        queries, setup=clear_query_cache, track_memory=track_memory
+    ))
+    results.append(measure(
+        'filter_restaurants:city', rows,
+        each(lambda: (rng.choice(cuisines), rng.choice(cities)),
+             lambda cuisine, city: filter_restaurants(df, cuisine, city=city)),
+        queries, setup=clear_query_cache, track_memory=track_memory
+    ))
+    results.append(measure(
+        'search_restaurants:first_page', rows,
+        each(lambda: (rng.choice(cuisines),),
+             lambda cuisine: search_restaurants(df, cuisine, sort_by='rating').page(0)),
+        queries, setup=clear_query_cache, track_memory=track_memory
+    ))
+    results.append(measure(
+        'get_restaurant_recommendations', rows,
+        each(lambda: (profile(),), lambda preferences: get_restaurant_recommendations(df, preferences)),
+        queries, setup=clear_query_cache, track_memory=track_memory
+    ))
+    results.append(measure(
+        'get_restaurant_recommendations:city', rows,
+        each(lambda: (dict(profile(), city=rng.choice(cities)),),
+             lambda preferences: get_restaurant_recommendations(df, preferences)),
+        queries, setup=clear_query_cache, track_memory=track_memory
+    ))
+    results.append(measure(
+        'get_restaurant_recommendations:cached', rows,
+        lambda p=profile(): get_restaurant_recommendations(df, p), queries,
+        track_memory=track_memory
+    ))
+    batch_profiles = [profile() for _ in range(100)]
+    results.append(measure(
+        'get_batch_recommendations:100_profiles', rows,
+        lambda: get_batch_recommendations(df, batch_profiles), max(queries // 20, 3),
+        setup=clear_query_cache, track_memory=track_memory
+    ))
+    # The same profiles one call at a time, for comparison with the batch
+    results.append(measure(
+        'get_restaurant_recommendations:100_profiles_loop', rows,
+        lambda: [get_restaurant_recommendations(df, p) for p in batch_profiles], max(queries // 20, 3),
+        setup=clear_query_cache, track_memory=track_memory
+    ))
+
+    # Training on the full 10M catalog takes too long to benchmark routinely
+    train_df = df if len(df) <= fit_rows else df.sample(fit_rows, random_state=seed)
+    predictor = RestaurantRatingPredictor(n_estimators=n_estimators)
+    results.append(measure(
+        f'RestaurantRatingPredictor.fit:{len(train_df)}_rows', rows, lambda: predictor.fit(train_df), 1,
+        track_memory=False
+    ))
+
+    predict_df = df.sample(min(len(df), 1000), random_state=seed)
+    results.append(measure(
+        'RestaurantRatingPredictor.predict:1000_rows', rows, lambda: predictor.predict(predict_df),
+        max(queries // 20, 3), track_memory=track_memory
+    ))
+    results.append(measure(
+        'RestaurantRatingPredictor.predict:1_row', rows, lambda: predictor.predict(predict_df.iloc[:1]),
+        queries, track_memory=track_memory
+    ))
+    record = {
+        'Cuisines': cuisines[0], 'City': cities[0], 'Average Cost for two': 500,
+        'Has Table booking': 'Yes', 'Has Online delivery': 'No'
+    }
+    results.append(measure(
+        'RestaurantRatingPredictor.predict_fast:1_row', rows, lambda: predictor.predict_fast(record),
+        queries, track_memory=track_memory
+    ))
+
+    clear_dataset_cache()
+    return results
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(baseline, current):
+    """
+    Print the p50 latency change of every operation present in both runs
+    """
+    previous = {(r['rows'], r['operation']): r for r in baseline['results']}
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} ({baseline.get('timestamp')}):")
+    for result in current['results']:
+        before = previous.get((result['rows'], result['operation']))
+        if before is None or not before['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms']
+        print(f"{result['rows']:>10} {result['operation']:<45} {before['p50_ms']:>10.3f} -> "
+              f"{result['p50_ms']:>10.3f} ms  ({ratio:.2f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data loading, search, recommendations and rating prediction on synthetic catalogs")
+    parser.add_argument("--sizes", default="10k,100k,1m", help="Comma-separated catalog sizes: 10k, 100k, 1m, 10m or a row count")
+    parser.add_argument("--queries", type=int, default=200, help="Timed calls per query operation")
+    parser.add_argument("--load-repeats", type=int, default=3, help="Timed cold loads per catalog")
+    parser.add_argument("--fit-rows", type=int, default=100_000, help="Rows sampled to benchmark model training")
+    parser.add_argument("--n-estimators", type=int, default=100, help="Trees in the benchmarked rating model")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default="benchmarks/data", help="Where generated catalogs are kept and reused")
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results-<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier JSON results to compare p50 latencies against")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced peak memory measurements")
+    args = parser.parse_args()
+
+    timestamp = datetime.now(timezone.utc)
+    report = {
+        'timestamp': timestamp.isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versions': {'numpy': np.__version__, 'pandas': pd.__version__, 'scikit-learn': sklearn.__version__},
+        'settings': vars(args),
+        'results': []
+    }
+
+    for label in args.sizes.split(','):
+        rows = _parse_size(label)
+        path = _catalog_path(args.data_dir, rows, args.seed)
+        if not os.path.exists(path):
+            print(f"Generating {rows} restaurants in {path}")
+            generate_catalog(path, rows, seed=args.seed)
+        report['results'].extend(run_catalog(
+            path, rows, queries=args.queries, load_repeats=args.load_repeats, fit_rows=args.fit_rows,
+            n_estimators=args.n_estimators, track_memory=not args.no_memory, seed=args.seed
+        ))
+
+    output = args.output or os.path.join('benchmarks', f"results-{timestamp.strftime('%Y%m%dT%H%M%S')}.json")
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_results(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import numpy as np
+
+class QueryCache:
+    """
+    Thread-safe LRU cache for query results shared by every session
+
+    Entries are evicted least recently used first once either max_entries
+    or max_bytes is exceeded. Sizes are measured with nbytes for NumPy
+    arrays and deep memory_usage for DataFrames, once when stored, and
+    counted as 1 KB otherwise.
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(value):
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(deep=True).sum())
+        return 1024
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for key, computing and storing it on a miss
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # Compute outside the lock so slow queries do not block cache hits
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        size = self._size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            # Entries are (value, size) so sizes are only measured once
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Hit/miss counters and current size of the cache
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,504 @@
+import bisect
+import copy
+import itertools
+import threading
+import weakref
+
+import pandas as pd
+import numpy as np
+from scipy import sparse
+
+from metrics_utils import timer
+
+# Indexes built for live frames: id(df) -> (weakref to df, index)
+_index_registry = {}
+_index_lock = threading.Lock()
+
+# Rating histogram bins for the dataset metadata
+RATING_BINS = np.arange(0, 5.5, 0.5)
+
+# Each index gets a distinct version, used to key cached query results
+_index_versions = itertools.count(1)
+
+def split_cuisines(value):
+    """
+    Split a cuisines string into normalized, de-duplicated cuisine tokens
+    """
+    if not isinstance(value, str):
+        return []
+
+    tokens = []
+    for token in value.split(','):
+        token = token.strip().lower()
+        if token and token != 'nan' and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+class PrefixIndex:
+    """
+    Frequency-ranked prefix lookup over a set of values, for autocomplete
+
+    Every word start of a value is a key, so 'ind' suggests both 'indian'
+    and 'north indian'. Keys are kept in a sorted list searched with
+    bisect; suggestions for one- and two-letter prefixes, which match the
+    most keys, are precomputed.
+    """
+    def __init__(self, counts):
+        # Values ranked by count, then name
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+        self.values = [value for value, _ in ranked]
+        self.counts = [int(count) for _, count in ranked]
+
+        entries = []
+        for rank, value in enumerate(self.values):
+            lowered = str(value).lower()
+            for start in range(len(lowered)):
+                if start == 0 or (lowered[start - 1] == ' ' and lowered[start] != ' '):
+                    entries.append((lowered[start:], rank))
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._ranks = np.array([rank for _, rank in entries], dtype=np.int64)
+
+        self._short_prefixes = {}
+        for key, rank in entries:
+            for length in (1, 2):
+                if len(key) >= length:
+                    self._short_prefixes.setdefault(key[:length], set()).add(rank)
+        self._short_prefixes = {
+            prefix: sorted(ranks) for prefix, ranks in self._short_prefixes.items()
+        }
+
+    def suggest(self, prefix='', limit=10):
+        """
+        Up to limit (value, count) pairs whose words start with prefix, most
+        frequent first; every value when prefix is empty and limit is None
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            ranks = range(len(self.values))
+        elif len(prefix) <= 2:
+            ranks = self._short_prefixes.get(prefix, [])
+        else:
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + '\uffff', start)
+            ranks = np.unique(self._ranks[start:end]).tolist()
+        if limit is not None:
+            ranks = ranks[:limit]
+        return [(self.values[rank], self.counts[rank]) for rank in ranks]
+
+class _ScoringIndex:
+    """
+    Cuisine lookups and scoring over a set of restaurants
+
+    Subclasses provide cuisine_ids, cuisine_vocab, cuisine_matrix, ratings,
+    costs and rows, the frame positions of their restaurants (None when
+    they cover the whole frame). Score arrays have one entry per restaurant
+    of the index; frame_positions() maps their positions back to the frame.
+    """
+    rows = None
+
+    def _build_postings(self):
+        """
+        Postings are the sorted frame positions of each cuisine column
+        """
+        by_cuisine = self.cuisine_matrix.tocsc()
+        by_cuisine.sort_indices()
+        self._postings_indptr = by_cuisine.indptr
+        # Positions into the score arrays, and the same mapped to the frame
+        self._local_postings = by_cuisine.indices.astype(np.int64)
+        self._postings = self.frame_positions(self._local_postings)
+
+    def frame_positions(self, positions):
+        """
+        Frame row positions of positions into this index's score arrays
+        """
+        return positions if self.rows is None else self.rows[positions]
+
+    def rows_for_cuisine(self, cuisine):
+        """
+        Sorted frame positions of restaurants serving exactly this cuisine
+        """
+        column = self.cuisine_ids.get(cuisine.strip().lower())
+        if column is None:
+            return np.empty(0, dtype=np.int64)
+        start, end = self._postings_indptr[column], self._postings_indptr[column + 1]
+        return self._postings[start:end]
+
+    def cuisine_query_vector(self, cuisines):
+        """
+        Count vector over the cuisine vocabulary for a list of cuisines
+        """
+        query = np.zeros(len(self.cuisine_vocab), dtype=np.float64)
+        for cuisine in cuisines:
+            column = self.cuisine_ids.get(cuisine.strip().lower())
+            if column is not None:
+                query[column] += 1
+        return query
+
+    def recommendation_scores(self, preferred_cuisines, max_budget=float('inf'), min_rating=0):
+        """
+        Score every restaurant against one preference profile
+
+        Cuisine matches weigh 30 points each, rating 8 points per star above
+        min_rating and budget up to 30 points. Restaurants with a missing
+        rating or cost score NaN.
+        """
+        scores = self.cuisine_matrix @ (self.cuisine_query_vector(preferred_cuisines) * 30)
+        scores += (self.ratings - min_rating) * 8
+        budget_score = 30 * (1 - self.costs / (max_budget * 2))
+        scores += np.maximum(budget_score, 0)
+        return scores
+
+    def batch_top_k(self, profiles, k):
+        """
+        Positions of the k best restaurants for each of several preference
+        profiles, the same as top_k_positions() over recommendation_scores()
+        for each profile
+
+        Without cuisine matches a restaurant scores only its rating and
+        budget points, which depend on nothing but (max_budget, min_rating).
+        So the k best of those base scores are found once per distinct pair,
+        and each profile only scores the restaurants serving one of its
+        cuisines: its top k is among them and the base top k.
+        """
+        base_top = {}
+        results = []
+        for profile in profiles:
+            max_budget = float(profile.get('max_budget', float('inf')))
+            min_rating = float(profile.get('min_rating', 0))
+            terms = (max_budget, min_rating)
+            if terms not in base_top:
+                base = self._base_scores(np.arange(self.n_rows), max_budget, min_rating)
+                top = top_k_positions(base, k)
+                base_top[terms] = (top, base[top])
+            top, top_scores = base_top[terms]
+
+            query = self.cuisine_query_vector(profile['preferred_cuisines']) * 30
+            columns = np.flatnonzero(query)
+            starts, ends = self._postings_indptr[columns], self._postings_indptr[columns + 1]
+            if not np.any(ends > starts):
+                results.append(top)
+                continue
+
+            if len(columns) == 1:
+                # Postings are sorted and distinct already
+                matched = self._local_postings[starts[0]:ends[0]]
+                cuisine_points = np.full(len(matched), query[columns[0]])
+            else:
+                points = np.bincount(
+                    np.concatenate([self._local_postings[start:end] for start, end in zip(starts, ends)]),
+                    weights=np.repeat(query[columns], ends - starts),
+                    minlength=self.n_rows
+                )
+                matched = np.flatnonzero(points)
+                cuisine_points = points[matched]
+            # Added in the same order as recommendation_scores(), so ties match
+            matched_scores = self._base_scores(matched, max_budget, min_rating, cuisine_points)
+            best = top_k_positions(matched_scores, k)
+
+            # Merge the best matched restaurants with the unmatched base top k;
+            # ties are broken by position, so candidates go in position order
+            found = np.searchsorted(matched, top).clip(max=len(matched) - 1)
+            unmatched = matched[found] != top
+            candidates = np.concatenate([matched[best], top[unmatched]])
+            scores = np.concatenate([matched_scores[best], top_scores[unmatched]])
+            order = np.argsort(candidates)
+            candidates, scores = candidates[order], scores[order]
+            results.append(candidates[top_k_positions(scores, k)])
+        return results
+
+    def _base_scores(self, positions, max_budget, min_rating, cuisine_points=0.0):
+        """
+        recommendation_scores() at positions, given their cuisine points
+        """
+        scores = cuisine_points + (self.ratings[positions] - min_rating) * 8
+        scores += np.maximum(30 * (1 - self.costs[positions] / (max_budget * 2)), 0)
+        return scores
+
+class RestaurantIndex(_ScoringIndex):
+    """
+    Lookup structures built once per restaurant frame
+    """
+    def __init__(self, df, stored=None):
+        """
+        stored holds the index arrays of a columnar store df was loaded
+        from (see storage_utils.load_columnar_index); they are used in place
+        of tokenizing and grouping every row
+        """
+        self.n_rows = len(df)
+        self.version = next(_index_versions)
+        self.closed = np.zeros(self.n_rows, dtype=bool)
+
+        if stored is None:
+            self.cuisine_vocab = []
+            self.cuisine_ids = {}
+            self.cuisine_matrix = self._cuisine_rows(df['Cuisines'])
+            self._build_postings()
+        else:
+            self._load_postings(stored)
+
+        # Numeric columns used by the scoring engine
+        self.ratings = pd.to_numeric(df['Aggregate rating'], errors='coerce').to_numpy(dtype=np.float64)
+        self.costs = pd.to_numeric(df['Average Cost for two'], errors='coerce').to_numpy(dtype=np.float64)
+
+        if stored is None:
+            self._build_city_groups(df)
+        else:
+            self._load_city_groups(stored)
+        self.metadata = self._build_metadata(df, stored)
+
+    def _load_postings(self, stored):
+        """
+        Cuisine matrix and postings from a columnar store
+        """
+        self.cuisine_vocab = list(stored['cuisine_vocab'])
+        self.cuisine_ids = {token: column for column, token in enumerate(self.cuisine_vocab)}
+        indices = stored['cuisine_indices']
+        self.cuisine_matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, stored['cuisine_indptr']),
+            shape=(self.n_rows, len(self.cuisine_vocab))
+        )
+        # Token ids are stored sorted within each row
+        self.cuisine_matrix.has_sorted_indices = True
+        self._postings_indptr = stored['postings_indptr']
+        self._local_postings = stored['postings']
+        self._postings = self._local_postings
+
+    def _cuisine_rows(self, cuisines):
+        """
+        Restaurant x cuisine multi-hot rows for a column of cuisines strings,
+        adding unseen cuisines to the end of the vocabulary
+        """
+        # Tokenize each distinct cuisines string only once
+        codes, uniques = pd.factorize(cuisines, use_na_sentinel=True)
+        unique_tokens = [split_cuisines(value) for value in uniques]
+
+        new_tokens = {token for tokens in unique_tokens for token in tokens} - self.cuisine_ids.keys()
+        for token in sorted(new_tokens):
+            self.cuisine_ids[token] = len(self.cuisine_vocab)
+            self.cuisine_vocab.append(token)
+
+        # Distinct string x cuisine matrix, with an empty last row for missing values
+        indptr = np.zeros(len(uniques) + 2, dtype=np.int64)
+        indptr[1:len(uniques) + 1] = np.cumsum([len(tokens) for tokens in unique_tokens])
+        indptr[-1] = indptr[-2]
+        indices = np.array(
+            [self.cuisine_ids[token] for tokens in unique_tokens for token in tokens],
+            dtype=np.int32
+        )
+        unique_matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(uniques) + 1, len(self.cuisine_vocab))
+        )
+
+        codes = np.where(codes < 0, len(uniques), codes)
+        rows = unique_matrix[codes]
+        rows.sort_indices()
+        return rows
+
+    def _build_city_groups(self, df):
+        """
+        Group row positions by city; partitions are sliced out on first use
+        """
+        codes, cities = pd.factorize(df['City'], use_na_sentinel=True)
+        self.city_ids = {}
+        for code, city in enumerate(cities):
+            self.city_ids.setdefault(str(city).strip().lower(), code)
+
+        # Rows of city c are _city_rows[_city_indptr[c]:_city_indptr[c + 1]], in frame order
+        valid = codes >= 0
+        self._city_rows = np.flatnonzero(valid)[np.argsort(codes[valid], kind='stable')]
+        self._city_indptr = np.zeros(len(cities) + 1, dtype=np.int64)
+        self._city_indptr[1:] = np.cumsum(np.bincount(codes[valid], minlength=len(cities)))
+        self._partitions = {}
+        self._partitions_lock = threading.Lock()
+
+    def _load_city_groups(self, stored):
+        """
+        City groups from a columnar store, whose city codes follow the
+        order of first appearance like pd.factorize
+        """
+        self.city_ids = {}
+        for code, city in enumerate(stored['cities']):
+            self.city_ids.setdefault(str(city).strip().lower(), code)
+        self._city_rows = stored['city_rows']
+        self._city_indptr = stored['city_indptr']
+        self._partitions = {}
+        self._partitions_lock = threading.Lock()
+
+    def for_city(self, city):
+        """
+        CityPartition holding only the restaurants of city (matched
+        case-insensitively); empty for unknown cities
+        """
+        code = self.city_ids.get(str(city).strip().lower(), -1)
+        partition = self._partitions.get(code)
+        if partition is None:
+            if code < 0:
+                rows = np.empty(0, dtype=np.int64)
+            else:
+                rows = self._city_rows[self._city_indptr[code]:self._city_indptr[code + 1]]
+            with timer('index.city_partition'):
+                partition = CityPartition(self, rows)
+            with self._partitions_lock:
+                partition = self._partitions.setdefault(code, partition)
+        return partition
+
+    def _build_metadata(self, df, stored=None):
+        """
+        Summary statistics shown by the app, computed once per frame
+
+        Counts are ranked by count, cuisines then by name and cities by
+        first appearance, whether computed or read from a columnar store.
+        """
+        cuisine_counts = pd.Series(
+            np.diff(self._postings_indptr).astype(np.int64), index=self.cuisine_vocab, name='restaurants'
+        ).sort_index().sort_values(ascending=False, kind='stable')
+        cuisine_counts = cuisine_counts[cuisine_counts > 0]
+        if stored is None:
+            city_counts = df['City'][~self.closed].value_counts(sort=False)
+        else:
+            city_counts = pd.Series(stored['city_counts'], index=pd.Index(stored['cities'], name='City'), name='count')
+        city_counts = city_counts.sort_values(ascending=False, kind='stable')
+        city_counts = city_counts[city_counts > 0]
+
+        if stored is None:
+            ratings = self.ratings[~np.isnan(self.ratings)]
+            costs = self.costs[~np.isnan(self.costs)]
+            rating_histogram = np.histogram(ratings, bins=RATING_BINS)
+            cost_histogram = np.histogram(costs, bins=20)
+        else:
+            rating_histogram = stored['rating_histogram']
+            cost_histogram = stored['cost_histogram']
+
+        return {
+            'restaurants': int(self.n_rows - self.closed.sum()),
+            'cuisine_vocab': sorted(cuisine_counts.index),
+            'cuisine_counts': cuisine_counts,
+            'city_counts': city_counts,
+            'autocomplete': {
+                'cuisine': PrefixIndex(cuisine_counts),
+                'city': PrefixIndex(city_counts)
+            },
+            'rating_histogram': rating_histogram,
+            'cost_histogram': cost_histogram
+        }
+
+    def updated(self, df, changed, closed, reopened=()):
+        """
+        Index for df, a patched copy of this index's frame
+
+        df holds the same rows as before, with the rows at positions changed
+        replaced, followed by any appended rows; rows at positions closed are
+        removed from search and scoring and rows at positions reopened are
+        restored. Other closed rows stay closed, even when changed. Only the
+        touched rows are tokenized and the postings are rebuilt from the
+        patched matrix.
+        """
+        index = copy.copy(self)
+        index.version = next(_index_versions)
+        index.n_rows = len(df)
+        index.cuisine_vocab = list(self.cuisine_vocab)
+        index.cuisine_ids = dict(self.cuisine_ids)
+
+        touched = np.concatenate([np.asarray(changed, dtype=np.int64), np.arange(self.n_rows, len(df))])
+        reopened = np.asarray(reopened, dtype=np.int64)
+        touched = np.union1d(touched, reopened)
+        closed = np.asarray(closed, dtype=np.int64)
+
+        index.closed = np.concatenate([self.closed, np.zeros(len(df) - self.n_rows, dtype=bool)])
+        index.closed[reopened] = False
+        index.closed[closed] = True
+
+        # Drop the replaced and closed rows, then add the re-tokenized open ones
+        listed = touched[~index.closed[touched]]
+        touched_rows = index._cuisine_rows(df['Cuisines'].iloc[listed]).tocoo()
+        shape = (len(df), len(index.cuisine_vocab))
+        kept = self.cuisine_matrix.tocoo()
+        keep = ~index.closed
+        keep[touched] = False
+        kept_mask = keep[kept.row]
+        index.cuisine_matrix = sparse.csr_matrix(
+            (
+                np.concatenate([kept.data[kept_mask], touched_rows.data]),
+                (
+                    np.concatenate([kept.row[kept_mask], listed[touched_rows.row]]),
+                    np.concatenate([kept.col[kept_mask], touched_rows.col])
+                )
+            ),
+            shape=shape
+        )
+        index.cuisine_matrix.sort_indices()
+        index._build_postings()
+
+        index.ratings = np.concatenate([self.ratings, np.empty(len(df) - self.n_rows)])
+        index.costs = np.concatenate([self.costs, np.empty(len(df) - self.n_rows)])
+        index.ratings[touched] = pd.to_numeric(df['Aggregate rating'].iloc[touched], errors='coerce').to_numpy(dtype=np.float64)
+        index.costs[touched] = pd.to_numeric(df['Average Cost for two'].iloc[touched], errors='coerce').to_numpy(dtype=np.float64)
+        # Closed restaurants score NaN, which excludes them from recommendations
+        index.ratings[index.closed] = np.nan
+
+        # Cities of the touched rows may have changed
+        index._build_city_groups(df)
+        index.metadata = index._build_metadata(df)
+        return index
+
+class CityPartition(_ScoringIndex):
+    """
+    Slice of a RestaurantIndex covering the restaurants of one city
+
+    Queries on a partition only touch that city's rows, so their cost
+    scales with the size of the city rather than the whole catalog.
+    """
+    def __init__(self, index, rows):
+        self.rows = rows
+        self.n_rows = len(rows)
+        self.cuisine_vocab = index.cuisine_vocab
+        self.cuisine_ids = index.cuisine_ids
+        self.cuisine_matrix = index.cuisine_matrix[rows]
+        self._build_postings()
+        self.ratings = index.ratings[rows]
+        self.costs = index.costs[rows]
+
+def top_k_positions(scores, k):
+    """
+    Positions of the k highest scores, ties broken by position
+
+    Matches DataFrame.nlargest(k, keep='first') without sorting every score.
+    """
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.flatnonzero(~np.isnan(scores))
+    if len(candidates) > k:
+        # Keep everything tied with the k-th best so ties resolve like nlargest
+        partition = np.argpartition(-scores[candidates], k - 1)[:k]
+        threshold = scores[candidates[partition]].min()
+        candidates = candidates[scores[candidates] >= threshold]
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:k]]
+
+def get_restaurant_index(df):
+    """
+    Return the index for df, building it the first time df is seen
+    """
+    with _index_lock:
+        entry = _index_registry.get(id(df))
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+
+        index = RestaurantIndex(df)
+        _register(df, index)
+        return index
+
+def register_restaurant_index(df, index):
+    """
+    Use an already built index (e.g. from RestaurantIndex.updated) for df
+    """
+    with _index_lock:
+        _register(df, index)
+
+def _register(df, index):
+    key = id(df)
+    # Forget the index as soon as its frame is garbage collected
+    ref = weakref.ref(df, lambda _, key=key: _index_registry.pop(key, None))
+    _index_registry[key] = (ref, index)
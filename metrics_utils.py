@@ -0,0 +1,181 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
+
+# Instrumentation is off unless enabled here or with enable(); disabled timers
+# cost one flag check per call
+ENABLED = os.environ.get("RESTAURANT_METRICS", "0") == "1"
+TRACE_MEMORY = os.environ.get("RESTAURANT_METRICS_TRACEMALLOC", "0") == "1"
+
+# Latest durations kept per stage for percentiles
+RECENT_SAMPLES = 1024
+
+_stages = {}
+_counters = {}
+_metrics_lock = threading.Lock()
+_started_at = time.time()
+_NULL_TIMER = nullcontext()
+
+class _StageStats:
+    __slots__ = ('count', 'total', 'max', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent = np.array(self.recent) * 1000
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total * 1000 / self.count, 3),
+            'p50_ms': round(float(np.percentile(recent, 50)), 3),
+            'p99_ms': round(float(np.percentile(recent, 99)), 3),
+            'max_ms': round(self.max * 1000, 3)
+        }
+
+def enable(trace_memory=False):
+    """
+    Start recording stage timings and counters, plus Python memory
+    allocations with trace_memory=True
+    """
+    global ENABLED
+    ENABLED = True
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    global ENABLED
+    ENABLED = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def reset():
+    """
+    Forget every recorded timing and counter
+    """
+    global _started_at
+    with _metrics_lock:
+        _stages.clear()
+        _counters.clear()
+        _started_at = time.time()
+
+def record(stage, seconds):
+    with _metrics_lock:
+        stats = _stages.get(stage)
+        if stats is None:
+            stats = _stages[stage] = _StageStats()
+        stats.add(seconds)
+
+def increment(counter, amount=1):
+    if not ENABLED:
+        return
+    with _metrics_lock:
+        _counters[counter] = _counters.get(counter, 0) + amount
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+def timer(stage):
+    """
+    Context manager timing a block as stage
+    """
+    return _Timer(stage) if ENABLED else _NULL_TIMER
+
+def timed(stage):
+    """
+    Decorator timing every call of a function as stage
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def start_timer():
+    """
+    Start time for stop_timer(), or None when instrumentation is off; for
+    stages that do not fit in a with block, such as a whole script rerun
+    """
+    return time.perf_counter() if ENABLED else None
+
+def stop_timer(stage, started):
+    if started is not None:
+        record(stage, time.perf_counter() - started)
+
+def _memory_snapshot(top=10):
+    """
+    Traced memory totals and the source lines allocating the most
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    statistics = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__)
+    ]).statistics('lineno')
+    return {
+        'current_mb': round(current / 2**20, 3),
+        'peak_mb': round(peak / 2**20, 3),
+        'top_allocations': [
+            {'location': str(stat.traceback[0]), 'size_mb': round(stat.size / 2**20, 3), 'blocks': stat.count}
+            for stat in statistics[:top]
+        ]
+    }
+
+def snapshot():
+    """
+    Machine-readable view of every recorded stage and counter
+    """
+    with _metrics_lock:
+        stages = {stage: stats.summary() for stage, stats in sorted(_stages.items())}
+        counters = dict(sorted(_counters.items()))
+    return {
+        'enabled': ENABLED,
+        'since': _started_at,
+        'stages': stages,
+        'counters': counters,
+        'memory': _memory_snapshot()
+    }
+
+def dump(path):
+    """
+    Write snapshot() to a JSON file
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2)
+
+if ENABLED and TRACE_MEMORY:
+    tracemalloc.start()
@@ -1,20 +1,89 @@
+import copy
+import hashlib
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
 import pandas as pd
 import numpy as np
+from sklearn.base import clone
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestRegressor
 from category_encoders import TargetEncoder
 
+from metrics_utils import timed, timer, increment
+
+MODEL_PATH = "models/rating_predictor.joblib"
+
+# Cores used to train the forest (-1 uses all of them)
+TRAINING_JOBS = int(os.environ.get("RESTAURANT_TRAINING_JOBS", "-1"))
+
+NUMERICAL_FEATURES = [
+    'Average Cost for two',
+    'Cuisines_Count',
+    'Has_Table_booking',
+    'Has_Online_delivery'
+]
+
+# Restaurant key column, hashed as exact integers
+KEY_COLUMN = 'Restaurant ID'
+
+# Background model managers: (model path, model params) -> ModelManager
+_model_managers = {}
+_model_managers_lock = threading.Lock()
+
+def _canonical_column(column):
+    """
+    A column's values in one representation for every way the dataset can
+    be loaded (CSV, columnar store, compact dtypes)
+    """
+    if isinstance(column.dtype, pd.BooleanDtype) or pd.api.types.is_bool_dtype(column.dtype):
+        return column.astype(object).map({True: 'Yes', False: 'No'})
+    if column.name == KEY_COLUMN:
+        return column.astype(np.int64)
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        # Stores and compact mode keep ratings and costs as float32
+        return column.astype(np.float32).astype(np.float64)
+    return column.astype(object).where(column.notna(), None)
+
+def dataset_fingerprint(df):
+    """
+    Fingerprint of the training data used to validate a saved model
+
+    Depends only on the values, not on their dtypes, so the same data
+    loaded from the CSV, the columnar store or in compact mode shares one
+    model artifact.
+    """
+    canonical = pd.DataFrame({column: _canonical_column(df[column]) for column in df.columns})
+    hashed = pd.util.hash_pandas_object(canonical, index=False).values
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
 class RestaurantRatingPredictor:
-    def __init__(self):
+    def __init__(self, n_estimators=100, max_depth=None, min_samples_leaf=1, n_jobs=TRAINING_JOBS):
+        # Parameters that change the fitted model; n_jobs only changes speed
+        self.model_params = {
+            'n_estimators': n_estimators,
+            'max_depth': max_depth,
+            'min_samples_leaf': min_samples_leaf
+        }
         self.model = RandomForestRegressor(
-            n_estimators=100,
+            n_estimators=n_estimators,
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            n_jobs=n_jobs,
             random_state=42
         )
         self.scaler = StandardScaler()
         self.cuisine_encoder = TargetEncoder()
         self.location_encoder = TargetEncoder()
         self.is_trained = False
+        self.val_score = None
+        self.data_fingerprint = None
+        self._fast_predictor = None
 
     def preprocess_data(self, df):
         """
@@ -25,14 +94,16 @@ class RestaurantRatingPredictor:
 
         # Extract features
         features_df['Cuisines_Count'] = features_df['Cuisines'].str.count(',') + 1
-        features_df['Has_Table_booking'] = features_df['Has Table booking'].map({'Yes': 1, 'No': 0})
-        features_df['Has_Online_delivery'] = features_df['Has Online delivery'].map({'Yes': 1, 'No': 0})
+        # Flags may be 'Yes'/'No' strings or booleans in compact frames
+        flag_values = {'Yes': 1, 'No': 0, True: 1, False: 0}
+        features_df['Has_Table_booking'] = features_df['Has Table booking'].astype(object).map(flag_values)
+        features_df['Has_Online_delivery'] = features_df['Has Online delivery'].astype(object).map(flag_values)
 
         # Extract primary cuisine (first one listed)
-        features_df['Primary_Cuisine'] = features_df['Cuisines'].str.split(',').str[0]
+        features_df['Primary_Cuisine'] = features_df['Cuisines'].astype(object).str.split(',').str[0]
 
-        # Extract city from address
-        features_df['City'] = features_df['City']
+        # Categorical columns are encoded by value, not by category code
+        features_df['City'] = features_df['City'].astype(object)
 
         # Select features for model
         feature_columns = [
@@ -53,6 +124,7 @@ class RestaurantRatingPredictor:
 
         return X, y
 
+    @timed('model.fit')
     def fit(self, df):
         """
         Train the model on the provided data
@@ -81,18 +153,11 @@ class RestaurantRatingPredictor:
         X_val_encoded['City'] = self.location_encoder.transform(X_val['City'])
 
         # Scale numerical features
-        numerical_features = [
-            'Average Cost for two',
-            'Cuisines_Count',
-            'Has_Table_booking',
-            'Has_Online_delivery'
-        ]
-
-        X_train_encoded[numerical_features] = self.scaler.fit_transform(
-            X_train_encoded[numerical_features]
+        X_train_encoded[NUMERICAL_FEATURES] = self.scaler.fit_transform(
+            X_train_encoded[NUMERICAL_FEATURES]
         )
-        X_val_encoded[numerical_features] = self.scaler.transform(
-            X_val_encoded[numerical_features]
+        X_val_encoded[NUMERICAL_FEATURES] = self.scaler.transform(
+            X_val_encoded[NUMERICAL_FEATURES]
         )
 
         # Train model
@@ -101,8 +166,10 @@ class RestaurantRatingPredictor:
 
         # Return validation score
         val_score = self.model.score(X_val_encoded, y_val)
+        self.val_score = val_score
         return val_score
 
+    @timed('model.predict')
     def predict(self, df):
         """
         Make predictions for new restaurants
@@ -113,20 +180,445 @@ class RestaurantRatingPredictor:
         # Preprocess data
         X, _ = self.preprocess_data(df)
 
-        # Encode categorical variables
+        # Make predictions
+        predictions = self.model.predict(self._transform(X))
+        return predictions
+
+    def _transform(self, X):
+        """
+        Encode and scale preprocessed features with the fitted transformers
+        """
         X_encoded = X.copy()
         X_encoded['Primary_Cuisine'] = self.cuisine_encoder.transform(X['Primary_Cuisine'])
         X_encoded['City'] = self.location_encoder.transform(X['City'])
+        X_encoded[NUMERICAL_FEATURES] = self.scaler.transform(X_encoded[NUMERICAL_FEATURES])
+        return X_encoded
 
-        # Scale numerical features
-        numerical_features = [
-            'Average Cost for two',
-            'Cuisines_Count',
-            'Has_Table_booking',
-            'Has_Online_delivery'
-        ]
-        X_encoded[numerical_features] = self.scaler.transform(X_encoded[numerical_features])
+    @timed('model.update')
+    def update(self, df, n_new_trees=10, refit_encoders=False):
+        """
+        Warm-start the trained model on new restaurants instead of
+        retraining from zero
 
-        # Make predictions
-        predictions = self.model.predict(X_encoded)
-        return predictions
\ No newline at end of file
+        Adds n_new_trees trees fitted on df to the existing forest. With
+        refit_encoders=True the cuisine and city target encoders are first
+        refitted on df, which should then be the full updated catalog.
+        Returns the validation score on a held-out part of df.
+        """
+        if not self.is_trained:
+            raise ValueError("Model needs to be trained before it can be updated")
+
+        X, y = self.preprocess_data(df)
+        if len(X) >= 5:
+            X_train, X_val, y_train, y_val = train_test_split(
+                X, y, test_size=0.2, random_state=42
+            )
+        else:
+            X_train, X_val, y_train, y_val = X, X, y, y
+
+        if refit_encoders:
+            self.cuisine_encoder.fit(X_train['Primary_Cuisine'], y_train)
+            self.location_encoder.fit(X_train['City'], y_train)
+
+        X_val_encoded = self._transform(X_val)
+        if n_new_trees > 0:
+            # Only the added trees are fitted when warm_start is on
+            n_estimators = len(self.model.estimators_) + n_new_trees
+            self.model.set_params(warm_start=True, n_estimators=n_estimators)
+            self.model.fit(self._transform(X_train), y_train)
+            self.model.set_params(warm_start=False)
+            self.model_params['n_estimators'] = n_estimators
+
+        # The compiled fast path and the data fingerprint are now stale
+        self._fast_predictor = None
+        self.data_fingerprint = None
+
+        self.val_score = self.model.score(X_val_encoded, y_val)
+        return self.val_score
+
+    @timed('model.refresh_encoders')
+    def with_refreshed_encoders(self, df):
+        """
+        Copy of the trained predictor whose target encoders are refitted on
+        df, the updated catalog, while keeping the existing forest
+
+        Much cheaper than update(): no trees are fitted, so new cuisines and
+        cities and changed ratings reach predictions straight away. The
+        copy shares the forest with this predictor, which is left unchanged.
+        """
+        if not self.is_trained:
+            raise ValueError("Model needs to be trained before it can be updated")
+
+        X, y = self.preprocess_data(df)
+        refreshed = copy.copy(self)
+        refreshed.cuisine_encoder = clone(self.cuisine_encoder).fit(X['Primary_Cuisine'], y)
+        refreshed.location_encoder = clone(self.location_encoder).fit(X['City'], y)
+        refreshed._fast_predictor = None
+        refreshed.data_fingerprint = None
+        return refreshed
+
+    def compile_fast_path(self):
+        """
+        The FastRatingPredictor used by predict_fast(), built on first use
+        """
+        if getattr(self, '_fast_predictor', None) is None:
+            with timer('model.compile_fast_path'):
+                self._fast_predictor = FastRatingPredictor(self)
+        return self._fast_predictor
+
+    @timed('model.predict_fast')
+    def predict_fast(self, records):
+        """
+        Predict ratings for one record dict or a list of them, bypassing
+        pandas and sklearn overhead (see FastRatingPredictor)
+        """
+        if not self.is_trained:
+            raise ValueError("Model needs to be trained before making predictions")
+
+        predictions = self.compile_fast_path().predict_records(records)
+        increment('model.predicted_rows', len(predictions))
+        return predictions
+
+    def __getstate__(self):
+        # The fast path is derived from the fitted model and rebuilt on demand
+        state = self.__dict__.copy()
+        state['_fast_predictor'] = None
+        return state
+
+    def save(self, path=MODEL_PATH):
+        """
+        Persist the fitted model, scaler and encoders as a single artifact
+        """
+        if not self.is_trained:
+            raise ValueError("Model needs to be trained before it can be saved")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial artifact
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """
+        Load a predictor saved with save()
+        """
+        predictor = joblib.load(path)
+        if not isinstance(predictor, cls):
+            raise ValueError(f"{path} does not contain a {cls.__name__}")
+        return predictor
+
+class FastRatingPredictor:
+    """
+    Low-latency prediction path compiled from a fitted RestaurantRatingPredictor
+
+    Target encoders become dict lookups, the scaler its mean and scale
+    arrays, and the forest a set of flat node arrays evaluated for every
+    row and tree at once. Batches larger than SMALL_BATCH_ROWS go through
+    each tree's compiled predict instead. Predictions match
+    RestaurantRatingPredictor.predict.
+    """
+    SMALL_BATCH_ROWS = 8
+
+    def __init__(self, predictor):
+        self.cuisine_lookup = self._encoder_lookup(predictor.cuisine_encoder)
+        self.city_lookup = self._encoder_lookup(predictor.location_encoder)
+        self.scale_mean = predictor.scaler.mean_.astype(np.float64)
+        self.scale_scale = predictor.scaler.scale_.astype(np.float64)
+        self._compile_forest(predictor.model.estimators_)
+
+    @staticmethod
+    def _encoder_lookup(encoder):
+        """
+        Encoded value of every known category, plus the unknown and missing values
+        """
+        column = encoder.cols[0]
+        categories = [c for c in encoder.ordinal_encoder.category_mapping[0]['mapping'].index if pd.notnull(c)]
+        probe = pd.Series(categories + ['\0unknown', np.nan], name=column, dtype=object)
+        encoded = encoder.transform(probe)[column].to_numpy(dtype=np.float64)
+        return {
+            'values': dict(zip(categories, encoded[:-2])),
+            'unknown': encoded[-2],
+            'missing': encoded[-1]
+        }
+
+    def _compile_forest(self, estimators):
+        """
+        Concatenate every tree into flat arrays; leaves point to themselves
+        """
+        left, right, feature, threshold, value, missing_left, roots = [], [], [], [], [], [], []
+        offset = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            left.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            right.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            value.append(tree.value[:, 0, 0])
+            missing_left.append(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=bool)).astype(bool))
+            roots.append(offset)
+            offset += tree.node_count
+
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold)
+        self.value = np.concatenate(value)
+        self.missing_left = np.concatenate(missing_left)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = max(estimator.tree_.max_depth for estimator in estimators)
+        self.trees = [estimator.tree_ for estimator in estimators]
+
+    def _encode(self, lookup, value):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return lookup['missing']
+        return lookup['values'].get(value, lookup['unknown'])
+
+    def transform_records(self, records):
+        """
+        Feature array in model column order for record dicts shaped like
+        dataset rows ('Cuisines', 'City', 'Average Cost for two',
+        'Has Table booking', 'Has Online delivery')
+        """
+        if isinstance(records, dict):
+            records = [records]
+
+        flag_values = {'Yes': 1.0, 'No': 0.0, True: 1.0, False: 0.0}
+        X = np.empty((len(records), 6), dtype=np.float64)
+        for i, record in enumerate(records):
+            cuisines = record['Cuisines']
+            if isinstance(cuisines, str):
+                # Lowercased like the dataset the model was trained on
+                cuisines = cuisines.lower()
+            primary_cuisine = cuisines.split(',')[0] if isinstance(cuisines, str) else np.nan
+            X[i, 0] = float(record['Average Cost for two'])
+            X[i, 1] = cuisines.count(',') + 1 if isinstance(cuisines, str) else np.nan
+            X[i, 2] = flag_values.get(record['Has Table booking'], np.nan)
+            X[i, 3] = flag_values.get(record['Has Online delivery'], np.nan)
+            X[i, 4] = self._encode(self.cuisine_lookup, primary_cuisine)
+            X[i, 5] = self._encode(self.city_lookup, record['City'])
+
+        X[:, :4] = (X[:, :4] - self.scale_mean) / self.scale_scale
+        return X
+
+    def predict_array(self, X):
+        """
+        Evaluate the forest on an encoded and scaled feature array
+        """
+        # Trees compare float32 features, as sklearn does internally
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if len(X) > self.SMALL_BATCH_ROWS:
+            return np.mean([tree.predict(X)[:, 0] for tree in self.trees], axis=0)
+
+        X = X.astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(x), self.missing_left[nodes], x <= self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes].mean(axis=1)
+
+    def predict_records(self, records):
+        return self.predict_array(self.transform_records(records))
+
+def _is_current(predictor, fingerprint, expected_params):
+    """
+    Whether predictor was trained on data with this fingerprint and these parameters
+    """
+    return (predictor.data_fingerprint == fingerprint
+            and getattr(predictor, 'model_params', None) == expected_params)
+
+def _load_current(path, fingerprint, expected_params):
+    """
+    The saved predictor at path if it is current, otherwise None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with timer('model.load'):
+            saved = RestaurantRatingPredictor.load(path)
+    except Exception:
+        # A corrupt or incompatible artifact is simply retrained
+        return None
+    return saved if _is_current(saved, fingerprint, expected_params) else None
+
+def _train_predictor_job(df, path, model_params):
+    """
+    Fit and save a predictor; runs in a background worker process
+    """
+    predictor = RestaurantRatingPredictor(**model_params)
+    predictor.fit(df)
+    predictor.data_fingerprint = dataset_fingerprint(df)
+    predictor.save(path)
+    return predictor.data_fingerprint
+
+class ModelManager:
+    """
+    Keeps a predictor available without ever fitting on the request path
+
+    get() returns the current model at once. When the data changed and no
+    matching artifact is saved, a worker process fits a new model and it is
+    swapped in when done, while the previous model (or None, the first
+    time) keeps being served.
+    """
+    def __init__(self, path=MODEL_PATH, **model_params):
+        self.path = path
+        self.model_params = model_params
+        self.expected_params = RestaurantRatingPredictor(**model_params).model_params
+        self.predictor = None
+        self.error = None
+        self._training = None
+        self._training_done = None
+        self._failed = None
+        self._fingerprints = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def status(self):
+        if self._training is not None:
+            return 'warming'
+        if self.error is not None:
+            return 'failed'
+        return 'ready' if self.predictor is not None else 'warming'
+
+    def _fingerprint(self, df):
+        # Hash each frame only once
+        entry = self._fingerprints.get(id(df))
+        if entry is None or entry[0]() is not df:
+            entry = (weakref.ref(df), dataset_fingerprint(df))
+            self._fingerprints = {id(df): entry}
+        return entry[1]
+
+    def get(self, df):
+        """
+        The predictor to serve for df, or None while the first model warms up
+        """
+        fingerprint = self._fingerprint(df)
+        with self._lock:
+            if self.predictor is not None and _is_current(self.predictor, fingerprint, self.expected_params):
+                return self.predictor
+
+            if fingerprint not in (self._training, self._failed):
+                saved = _load_current(self.path, fingerprint, self.expected_params)
+                if saved is not None:
+                    self.predictor = saved
+                    self.error = None
+                else:
+                    self._start_training(df, fingerprint)
+
+            return self.predictor
+
+    def _start_training(self, df, fingerprint):
+        if self._executor is None:
+            # Spawn rather than fork: the serving process runs many threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context('spawn')
+            )
+        self._training = fingerprint
+        self._training_done = training_done = threading.Event()
+        future = self._executor.submit(_train_predictor_job, df, self.path, self.model_params)
+        future.add_done_callback(lambda done: self._finish_training(done, fingerprint, training_done))
+
+    def _finish_training(self, future, fingerprint, training_done):
+        predictor = error = None
+        try:
+            future.result()
+            predictor = _load_current(self.path, fingerprint, self.expected_params)
+            if predictor is None:
+                raise ValueError("Trained model artifact could not be loaded")
+        except Exception as e:
+            error = f"Error training rating model: {str(e)}"
+
+        with self._lock:
+            training_done.set()
+            if fingerprint != self._training:
+                # A job for newer data is queued; it decides what is served,
+                # but an older model beats none at all
+                if self.predictor is None and predictor is not None:
+                    self.predictor = predictor
+                return
+
+            self._training = None
+            if predictor is None:
+                self._failed = fingerprint
+                self.error = error
+                return
+
+            # Swap the new model in for every subsequent request
+            self.predictor = predictor
+            self.error = None
+            self._failed = None
+
+    def apply_update(self, df):
+        """
+        Serve a predictor for df, an incrementally updated catalog, without
+        retraining: the current model's target encoders are refitted on df
+
+        Returns False when there is no trained model yet; get(df) then
+        trains one in the background as usual.
+        """
+        fingerprint = self._fingerprint(df)
+        with self._lock:
+            predictor = self.predictor
+        if predictor is None:
+            return False
+
+        refreshed = predictor.with_refreshed_encoders(df)
+        refreshed.data_fingerprint = fingerprint
+        with self._lock:
+            self.predictor = refreshed
+            self.error = None
+        return True
+
+    def preload(self, df):
+        """
+        Load the model for df now, training it in this process if no
+        current artifact is saved, and compile its fast path
+
+        For a parent process preparing state that forked workers share:
+        nothing is left running in the background.
+        """
+        fingerprint = self._fingerprint(df)
+        predictor = _load_current(self.path, fingerprint, self.expected_params)
+        if predictor is None:
+            _train_predictor_job(df, self.path, self.model_params)
+            predictor = _load_current(self.path, fingerprint, self.expected_params)
+            if predictor is None:
+                raise ValueError("Trained model artifact could not be loaded")
+        predictor.compile_fast_path()
+
+        with self._lock:
+            self.predictor = predictor
+            self.error = None
+        return predictor
+
+    def wait(self, df, timeout=None):
+        """
+        Block until a model for df is available; for scripts and tests
+        """
+        predictor = self.get(df)
+        with self._lock:
+            training_done = self._training_done if self._training is not None else None
+        if training_done is not None:
+            training_done.wait(timeout)
+            predictor = self.get(df)
+        return predictor
+
+def get_model_manager(path=MODEL_PATH, **model_params):
+    """
+    Process-wide ModelManager for a model path and parameters
+    """
+    key = (path, tuple(sorted(model_params.items())))
+    with _model_managers_lock:
+        if key not in _model_managers:
+            _model_managers[key] = ModelManager(path, **model_params)
+        return _model_managers[key]
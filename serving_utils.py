@@ -0,0 +1,112 @@
+import gc
+import os
+import signal
+
+from utils import DATASET_PATH, ensure_columnar_store, load_and_process_data
+from ml_utils import MODEL_PATH, get_model_manager
+from similarity_utils import get_similarity_index
+from text_search_utils import get_text_index
+
+def process_memory(pid=None):
+    """
+    Memory of a process in MB: rss counts shared pages in full, pss splits
+    them between the processes sharing them and private is what only this
+    process holds (Linux only; None elsewhere)
+    """
+    path = f"/proc/{pid or os.getpid()}/smaps_rollup"
+    try:
+        with open(path, encoding='ascii') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line and not line.startswith(' '))
+    except OSError:
+        return None
+
+    def megabytes(*names):
+        return round(sum(int(fields[name].split()[0]) for name in names if name in fields) / 1024, 1)
+
+    return {
+        'rss_mb': megabytes('Rss'),
+        'pss_mb': megabytes('Pss'),
+        'private_mb': megabytes('Private_Clean', 'Private_Dirty')
+    }
+
+def preload(dataset_path=DATASET_PATH, model_path=MODEL_PATH):
+    """
+    Load everything the API serves before workers are forked
+
+    The dataset comes from its columnar store, so the numeric columns and
+    categorical codes are memory-mapped from the page cache. The model is
+    loaded into memory (sklearn copies tree arrays out of any mapping on
+    unpickling), and the lookup, text and similarity indexes and the
+    compiled fast prediction path are built here, so workers inherit all
+    of it copy-on-write instead of building their own copies.
+    """
+    ensure_columnar_store(dataset_path)
+    df = load_and_process_data(dataset_path)
+    get_text_index(df)
+    get_similarity_index(df)
+    get_model_manager(model_path).preload(df)
+    return df
+
+def _run_worker(server):
+    # The parent's signal handlers do not apply to workers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+def serve_forked(server, processes):
+    """
+    Serve with processes forked workers accepting on server's socket
+
+    Call after preload() and before anything starts threads. The parent
+    only supervises: it replaces workers that die and stops them all on
+    SIGTERM or Ctrl+C.
+    """
+    if not hasattr(os, 'fork'):
+        raise RuntimeError("Multi-process serving needs os.fork, which this platform lacks")
+
+    # Keep the garbage collector from writing to objects shared with workers
+    gc.collect()
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(server)
+        workers.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(processes):
+        spawn()
+    print(f"Started {processes} workers: {', '.join(str(pid) for pid in sorted(workers))}")
+
+    try:
+        while workers:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            workers.discard(pid)
+            if not stopping:
+                print(f"Worker {pid} exited, starting a new one")
+                spawn()
+    finally:
+        server.server_close()
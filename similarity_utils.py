@@ -0,0 +1,141 @@
+import threading
+import weakref
+
+import pandas as pd
+import numpy as np
+from scipy import sparse
+
+from index_utils import get_restaurant_index
+from metrics_utils import timer
+
+# Relative weight of each feature group in the restaurant embedding
+SIMILARITY_WEIGHTS = {
+    'cuisines': 1.0,
+    'city': 0.5,
+    'cost': 0.5,
+    'rating': 0.5,
+    'services': 0.25
+}
+
+# Similarity indexes for live restaurant indexes: RestaurantIndex -> SimilarityIndex
+_similarity_indexes = weakref.WeakKeyDictionary()
+_similarity_lock = threading.Lock()
+
+def _standardize(values):
+    """
+    Zero-mean, unit-variance values, with missing values at the mean
+    """
+    values = np.where(np.isnan(values), np.nanmean(values) if np.any(~np.isnan(values)) else 0, values)
+    std = values.std()
+    return (values - values.mean()) / std if std > 0 else np.zeros_like(values)
+
+def _flag_values(column):
+    """
+    +0.5 for 'Yes', -0.5 for 'No' and 0 for missing service flags
+    """
+    flags = column.astype(object).map({'Yes': 0.5, 'No': -0.5, True: 0.5, False: -0.5})
+    return pd.to_numeric(flags, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+class SimilarityIndex:
+    """
+    Unit-length restaurant embeddings for "more like this" queries
+
+    Each restaurant is embedded from its cuisines (multi-hot scaled to unit
+    length), city (one-hot), cost (log cost standardized within its
+    currency, so prices compare across countries), rating and the booking
+    and delivery flags, weighted by SIMILARITY_WEIGHTS. The sparse
+    cuisine/city part and the small dense part are kept separately, so
+    scoring one query against every restaurant is a sparse matrix-vector
+    product plus a few dense columns rather than a pairwise pass.
+    """
+    def __init__(self, df, index):
+        weights = SIMILARITY_WEIGHTS
+        n_rows = len(df)
+
+        # Cuisine multi-hot rows scaled to unit length, then weighted
+        tokens = np.diff(index.cuisine_matrix.indptr)
+        cuisine_scale = np.divide(weights['cuisines'], np.sqrt(tokens), out=np.zeros(n_rows), where=tokens > 0)
+        cuisines = sparse.diags(cuisine_scale) @ index.cuisine_matrix
+
+        city_codes, cities = pd.factorize(df['City'], use_na_sentinel=True)
+        has_city = city_codes >= 0
+        city_onehot = sparse.csr_matrix(
+            (np.full(has_city.sum(), weights['city']), (np.flatnonzero(has_city), city_codes[has_city])),
+            shape=(n_rows, len(cities))
+        )
+
+        # Log costs standardized per currency
+        log_costs = np.log1p(np.clip(index.costs, 0, None))
+        cost_features = np.zeros(n_rows)
+        currency_codes, currencies = pd.factorize(df['Currency'], use_na_sentinel=False)
+        for code in range(len(currencies)):
+            in_currency = currency_codes == code
+            cost_features[in_currency] = _standardize(log_costs[in_currency])
+
+        dense = np.column_stack([
+            cost_features * weights['cost'],
+            _standardize(index.ratings) * weights['rating'],
+            _flag_values(df['Has Table booking']) * weights['services'],
+            _flag_values(df['Has Online delivery']) * weights['services']
+        ])
+
+        embedding = sparse.hstack([cuisines, city_onehot], format='csr')
+        norms = np.sqrt(np.asarray(embedding.multiply(embedding).sum(axis=1)).ravel() + (dense ** 2).sum(axis=1))
+        inverse_norms = np.divide(1.0, norms, out=np.zeros(n_rows), where=norms > 0)
+
+        self.n_rows = n_rows
+        self.sparse = (sparse.diags(inverse_norms) @ embedding).tocsr()
+        self.dense = dense * inverse_norms[:, None]
+        # Closed restaurants are never suggested
+        self.excluded = index.closed.copy()
+
+    def scores(self, positions, rows=None):
+        """
+        Cosine similarity of the restaurants at positions to every
+        restaurant, or only to those at frame positions rows
+
+        Returns a positions x restaurants matrix; the query restaurants
+        themselves and closed restaurants score NaN.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        candidates_sparse = self.sparse if rows is None else self.sparse[rows]
+        candidates_dense = self.dense if rows is None else self.dense[rows]
+
+        queries = self.sparse[positions].toarray()
+        scores = np.asarray((candidates_sparse @ queries.T).T)
+        scores += self.dense[positions] @ candidates_dense.T
+
+        candidate_rows = np.arange(self.n_rows) if rows is None else rows
+        scores[:, self.excluded[candidate_rows]] = np.nan
+        scores[candidate_rows[None, :] == positions[:, None]] = np.nan
+        return scores
+
+def get_similarity_index(df):
+    """
+    Return the similarity index for df, building it the first time
+    """
+    index = get_restaurant_index(df)
+    with _similarity_lock:
+        similarity = _similarity_indexes.get(index)
+        if similarity is None:
+            with timer('similarity.build'):
+                similarity = SimilarityIndex(df, index)
+            _similarity_indexes[index] = similarity
+        return similarity
+
+def update_similarity_index(df, previous, index):
+    """
+    Build the similarity index for index, the patched successor of the
+    RestaurantIndex previous, if previous had one, so queries after an
+    update do not pay for the build
+
+    The embedding standardizes costs and ratings over every restaurant, so
+    it is rebuilt rather than patched; that is cheap next to the text index.
+    """
+    with _similarity_lock:
+        if previous not in _similarity_indexes or index in _similarity_indexes:
+            return
+    with timer('similarity.build'):
+        similarity = SimilarityIndex(df, index)
+    with _similarity_lock:
+        _similarity_indexes.setdefault(index, similarity)
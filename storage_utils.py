@@ -0,0 +1,412 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+import numpy as np
+
+from index_utils import RATING_BINS, split_cuisines
+
+STORE_VERSION = 3
+
+# How each dataset column is laid out in a columnar store
+NUMERIC_COLUMNS = ['Aggregate rating', 'Average Cost for two']
+CATEGORICAL_COLUMNS = ['Cuisines', 'City', 'Currency', 'Has Table booking', 'Has Online delivery']
+TEXT_COLUMNS = ['Restaurant Name', 'Address']
+
+# Optional restaurant key, stored as int64 when present
+KEY_COLUMN = 'Restaurant ID'
+
+# Rows processed at a time when finishing the stored index arrays
+FINISH_CHUNK_ROWS = 1 << 20
+
+# Buckets of the stored cost histogram
+COST_HISTOGRAM_BINS = 20
+
+def columnar_store_path(path):
+    """
+    Directory holding the columnar copy of a CSV dataset
+    """
+    return f"{os.path.splitext(path)[0]}.columns"
+
+def _column_file(store_dir, column, suffix):
+    return os.path.join(store_dir, f"{column}.{suffix}")
+
+def _read_dictionary(store_dir, column):
+    """
+    Read a dictionary-encoded column as (memory-mapped codes, categories)
+    """
+    codes = np.load(_column_file(store_dir, column, 'codes.npy'), mmap_mode='r')
+    with open(_column_file(store_dir, column, 'categories.json'), encoding='utf-8') as f:
+        categories = json.load(f)
+    return codes, categories
+
+def _grow_counts(counts, codes, size):
+    """
+    counts plus the occurrences of each code, grown to size entries
+    """
+    counts = np.concatenate([counts, np.zeros(size - len(counts), dtype=np.int64)])
+    return counts + np.bincount(codes[codes >= 0], minlength=size)
+
+def _group_rows(store_path, groups, counts, n_entries):
+    """
+    Write the entry positions of each group, in order, as one array
+
+    groups(start, stop) yields the group of entries start to stop; entries
+    are grouped with a counting sort, a chunk at a time, so memory stays
+    bounded whatever the number of entries.
+    """
+    out = np.lib.format.open_memmap(store_path, mode='w+', dtype=np.int64, shape=(n_entries,))
+    next_slot = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    for start in range(0, n_entries, FINISH_CHUNK_ROWS):
+        chunk_groups = groups(start, min(start + FINISH_CHUNK_ROWS, n_entries))
+        valid = np.flatnonzero(chunk_groups >= 0)
+        order = valid[np.argsort(chunk_groups[valid], kind='stable')]
+        sorted_groups = chunk_groups[order]
+        group_counts = np.bincount(sorted_groups, minlength=len(counts))
+        # Rank of each entry within its group in this chunk
+        ranks = np.arange(len(order)) - np.repeat(np.cumsum(group_counts) - group_counts, group_counts)
+        out[next_slot[sorted_groups] + ranks] = start + order
+        next_slot += group_counts
+    out.flush()
+    del out
+
+class ColumnarWriter:
+    """
+    Build a columnar store chunk by chunk with bounded memory
+
+    Every appended chunk is written straight to per-column files, along with
+    the cuisine tokens of its rows; only the dictionaries of distinct
+    strings and running statistics (cuisine and city counts, rating
+    histogram, cost range) are kept in memory. close() derives the cuisine
+    postings and city groups a chunk at a time, so a loaded store does not
+    rebuild them (see load_columnar_index), then writes the metadata and
+    swaps the finished store in place atomically.
+    """
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.tmp_dir = f"{store_dir}.{os.getpid()}.tmp"
+        self.columns = None
+        self.rows = 0
+
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        self._files = {}
+        self._dictionaries = {column: {} for column in CATEGORICAL_COLUMNS + TEXT_COLUMNS}
+
+        # Cuisine vocabulary in order of first appearance, and the sorted
+        # token ids of each distinct cuisines string
+        self._cuisine_ids = {}
+        self._string_tokens = {}
+        self.cuisine_counts = np.zeros(0, dtype=np.int64)
+        self.city_counts = np.zeros(0, dtype=np.int64)
+        self.cuisine_entries = 0
+        self.rating_histogram = np.zeros(len(RATING_BINS) - 1, dtype=np.int64)
+        self.cost_range = None
+
+    def _raw_file(self, column):
+        if column not in self._files:
+            self._files[column] = open(_column_file(self.tmp_dir, column, 'raw'), 'wb')
+        return self._files[column]
+
+    def _encode(self, column, values):
+        """
+        Global dictionary codes for a chunk
+        """
+        local_codes, uniques = pd.factorize(values)
+        dictionary = self._dictionaries[column]
+        mapping = np.array(
+            [dictionary.setdefault(str(value), len(dictionary)) for value in uniques] + [-1],
+            dtype=np.int32
+        )
+        # Local code -1 (missing) picks the trailing -1
+        return mapping.take(local_codes)
+
+    def append(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+
+        if KEY_COLUMN in self.columns:
+            keys = pd.to_numeric(chunk[KEY_COLUMN], errors='raise').to_numpy(dtype=np.int64)
+            self._raw_file(KEY_COLUMN).write(keys.tobytes())
+
+        for column in NUMERIC_COLUMNS:
+            values = pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=np.float32)
+            self._raw_file(column).write(values.tobytes())
+            present = values[~np.isnan(values)]
+            if column == 'Aggregate rating':
+                self.rating_histogram += np.histogram(present, bins=RATING_BINS)[0]
+            elif len(present):
+                low, high = float(present.min()), float(present.max())
+                if self.cost_range is not None:
+                    low, high = min(low, self.cost_range[0]), max(high, self.cost_range[1])
+                self.cost_range = (low, high)
+
+        for column in CATEGORICAL_COLUMNS + TEXT_COLUMNS:
+            codes = self._encode(column, chunk[column])
+            self._raw_file(column).write(codes.tobytes())
+            if column == 'City':
+                self.city_counts = _grow_counts(self.city_counts, codes, len(self._dictionaries['City']))
+
+        self._append_cuisine_tokens(chunk['Cuisines'])
+        self.rows += len(chunk)
+
+    def _append_cuisine_tokens(self, cuisines):
+        """
+        Write the cuisine token ids of each row and the number of them
+        """
+        codes, uniques = pd.factorize(cuisines, use_na_sentinel=True)
+        unique_tokens = []
+        for value in uniques:
+            tokens = self._string_tokens.get(value)
+            if tokens is None:
+                ids = [self._cuisine_ids.setdefault(token, len(self._cuisine_ids)) for token in split_cuisines(value)]
+                tokens = self._string_tokens[value] = np.array(sorted(ids), dtype=np.int32)
+            unique_tokens.append(tokens)
+        # Missing values pick the empty last entry
+        unique_tokens.append(np.empty(0, dtype=np.int32))
+        codes = np.where(codes < 0, len(uniques), codes)
+
+        lengths = np.array([len(tokens) for tokens in unique_tokens], dtype=np.int32)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        flat = np.concatenate(unique_tokens)
+        row_lengths = lengths[codes]
+        offsets = np.arange(row_lengths.sum()) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+        tokens = flat[np.repeat(starts[codes], row_lengths) + offsets].astype(np.int32)
+
+        self._raw_file('cuisine_tokens').write(tokens.tobytes())
+        self._raw_file('cuisine_lengths').write(row_lengths.astype(np.int32).tobytes())
+        self.cuisine_entries += len(tokens)
+        self.cuisine_counts = _grow_counts(self.cuisine_counts, tokens, len(self._cuisine_ids))
+
+    def _finish_index(self):
+        """
+        Derive the stored index arrays from the finished columns
+        """
+        def load(name, suffix='npy'):
+            return np.load(_column_file(self.tmp_dir, name, suffix), mmap_mode='r')
+
+        # Row starts of the restaurant x cuisine matrix
+        lengths = load('cuisine_lengths')
+        indptr = np.lib.format.open_memmap(
+            _column_file(self.tmp_dir, 'cuisine_indptr', 'npy'), mode='w+', dtype=np.int64, shape=(self.rows + 1,)
+        )
+        indptr[0] = 0
+        total = 0
+        for start in range(0, self.rows, FINISH_CHUNK_ROWS):
+            stop = min(start + FINISH_CHUNK_ROWS, self.rows)
+            indptr[start + 1:stop + 1] = total + np.cumsum(lengths[start:stop], dtype=np.int64)
+            total = int(indptr[stop])
+        indptr.flush()
+        del indptr, lengths
+        os.remove(_column_file(self.tmp_dir, 'cuisine_lengths', 'npy'))
+
+        # Rows serving each cuisine, and rows of each city, in frame order
+        indptr = load('cuisine_indptr')
+        tokens = load('cuisine_tokens')
+        entry_rows = _column_file(self.tmp_dir, 'cuisine_entry_postings', 'npy')
+        _group_rows(entry_rows, lambda start, stop: tokens[start:stop], self.cuisine_counts, self.cuisine_entries)
+        # Map entry positions to their rows a chunk at a time
+        postings = np.lib.format.open_memmap(entry_rows, mode='r+')
+        for start in range(0, self.cuisine_entries, FINISH_CHUNK_ROWS):
+            stop = min(start + FINISH_CHUNK_ROWS, self.cuisine_entries)
+            postings[start:stop] = np.searchsorted(indptr, postings[start:stop], side='right') - 1
+        postings.flush()
+        del postings, indptr, tokens
+        os.replace(entry_rows, _column_file(self.tmp_dir, 'cuisine_postings', 'npy'))
+
+        city_codes = load('City', 'codes.npy')
+        _group_rows(
+            _column_file(self.tmp_dir, 'city_rows', 'npy'), lambda start, stop: city_codes[start:stop],
+            self.city_counts, self.rows
+        )
+        n_city_rows = int(self.city_counts.sum())
+        del city_codes
+
+        # Cost histogram over the full cost range, like np.histogram(costs, bins)
+        cost_histogram = np.zeros(COST_HISTOGRAM_BINS, dtype=np.int64)
+        cost_range = self.cost_range or (0.0, 1.0)
+        costs = load('Average Cost for two')
+        for start in range(0, self.rows, FINISH_CHUNK_ROWS):
+            values = costs[start:start + FINISH_CHUNK_ROWS].astype(np.float64)
+            cost_histogram += np.histogram(values[~np.isnan(values)], bins=COST_HISTOGRAM_BINS, range=cost_range)[0]
+        del costs
+
+        return {
+            'cuisine_vocab': list(self._cuisine_ids),
+            'cuisine_counts': self.cuisine_counts.tolist(),
+            'city_counts': self.city_counts.tolist(),
+            'city_rows': n_city_rows,
+            'rating_histogram': self.rating_histogram.tolist(),
+            'cost_histogram': cost_histogram.tolist(),
+            'cost_range': list(cost_range)
+        }
+
+    def _finish_column(self, column, suffix, dtype, length=None):
+        """
+        Turn a raw column file into a .npy array without loading it whole
+        """
+        raw_path = _column_file(self.tmp_dir, column, 'raw')
+        length = self.rows if length is None else length
+        if length:
+            values = np.memmap(raw_path, dtype=dtype, mode='r', shape=(length,))
+        else:
+            values = np.empty(0, dtype=dtype)
+        np.save(_column_file(self.tmp_dir, column, suffix), values)
+        del values
+        os.remove(raw_path)
+
+    def close(self, source=None):
+        """
+        Finish the store and return its metadata
+        """
+        try:
+            for column in NUMERIC_COLUMNS + CATEGORICAL_COLUMNS + TEXT_COLUMNS + ['cuisine_tokens', 'cuisine_lengths']:
+                self._raw_file(column).close()
+            if KEY_COLUMN in self._files:
+                self._files[KEY_COLUMN].close()
+                self._finish_column(KEY_COLUMN, 'npy', np.int64)
+            for column in NUMERIC_COLUMNS:
+                self._finish_column(column, 'npy', np.float32)
+            for column in CATEGORICAL_COLUMNS + TEXT_COLUMNS:
+                self._finish_column(column, 'codes.npy', np.int32)
+                with open(_column_file(self.tmp_dir, column, 'categories.json'), 'w', encoding='utf-8') as f:
+                    json.dump(list(self._dictionaries[column]), f)
+            self._finish_column('cuisine_tokens', 'npy', np.int32, self.cuisine_entries)
+            self._finish_column('cuisine_lengths', 'npy', np.int32)
+
+            meta = {
+                'version': STORE_VERSION,
+                'rows': self.rows,
+                'columns': self.columns or NUMERIC_COLUMNS + CATEGORICAL_COLUMNS + TEXT_COLUMNS,
+                'source': source,
+                'index': self._finish_index()
+            }
+            with open(os.path.join(self.tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+
+            # Swap the new store in place of the old one
+            old_dir = f"{self.store_dir}.{os.getpid()}.old"
+            if os.path.exists(self.store_dir):
+                os.rename(self.store_dir, old_dir)
+            os.rename(self.tmp_dir, self.store_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            return meta
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+def write_columnar(df, store_dir, source=None):
+    """
+    Write a processed restaurant frame to a columnar store
+
+    Ratings and costs are stored as float32 arrays, low-cardinality and
+    cuisine columns as categorical codes, and free text as dictionary codes.
+    source is recorded in the metadata so loaders can tell whether the
+    store is still current. The store is replaced atomically.
+    """
+    writer = ColumnarWriter(store_dir)
+    try:
+        writer.append(df)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close(source)
+
+def read_columnar_meta(store_dir):
+    """
+    Metadata of a columnar store, or None if there is no usable store
+    """
+    try:
+        with open(os.path.join(store_dir, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == STORE_VERSION else None
+
+def load_columnar(store_dir):
+    """
+    Load a columnar store into a restaurant frame
+
+    Numeric columns and categorical codes are memory-mapped, so their pages
+    come straight from the page cache and are shared between processes.
+    Names and addresses are decoded into object arrays, so the frame still
+    holds every row's text in memory; only the cuisine and city lookups
+    (see load_columnar_index) are stored, not the text or similarity indexes.
+    """
+    meta = read_columnar_meta(store_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No columnar store found at {store_dir}")
+
+    columns = {}
+    if KEY_COLUMN in meta['columns']:
+        columns[KEY_COLUMN] = np.load(_column_file(store_dir, KEY_COLUMN, 'npy'), mmap_mode='r')
+    for column in NUMERIC_COLUMNS:
+        columns[column] = np.load(_column_file(store_dir, column, 'npy'), mmap_mode='r')
+    for column in CATEGORICAL_COLUMNS:
+        codes, categories = _read_dictionary(store_dir, column)
+        columns[column] = pd.Categorical.from_codes(
+            codes, dtype=pd.CategoricalDtype(categories), validate=False
+        )
+    for column in TEXT_COLUMNS:
+        codes, categories = _read_dictionary(store_dir, column)
+        # Code -1 (missing) picks the trailing NaN
+        values = np.array(categories + [np.nan], dtype=object)
+        columns[column] = values.take(codes)
+
+    return pd.DataFrame(columns, copy=False)[meta['columns']]
+
+def load_columnar_index(store_dir):
+    """
+    Load the index arrays and statistics written with a columnar store
+
+    The cuisine matrix (CSR), its postings and the city groups are
+    memory-mapped like the columns; RestaurantIndex(df, stored) uses them
+    instead of tokenizing and grouping every row again.
+    """
+    meta = read_columnar_meta(store_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No columnar store found at {store_dir}")
+    stats = meta['index']
+
+    def load(name):
+        return np.load(_column_file(store_dir, name, 'npy'), mmap_mode='r')
+
+    cuisine_counts = np.array(stats['cuisine_counts'], dtype=np.int64)
+    city_counts = np.array(stats['city_counts'], dtype=np.int64)
+    _, cities = _read_dictionary(store_dir, 'City')
+    return {
+        'cuisine_vocab': stats['cuisine_vocab'],
+        'cuisine_indptr': load('cuisine_indptr'),
+        'cuisine_indices': load('cuisine_tokens'),
+        'postings_indptr': np.concatenate([[0], np.cumsum(cuisine_counts)]).astype(np.int64),
+        'postings': load('cuisine_postings'),
+        'cities': cities,
+        'city_rows': load('city_rows'),
+        'city_indptr': np.concatenate([[0], np.cumsum(city_counts)]).astype(np.int64),
+        'city_counts': city_counts,
+        'rating_histogram': (np.array(stats['rating_histogram'], dtype=np.int64), RATING_BINS),
+        'cost_histogram': (
+            np.array(stats['cost_histogram'], dtype=np.int64),
+            np.histogram_bin_edges(np.empty(0), bins=COST_HISTOGRAM_BINS, range=tuple(stats['cost_range']))
+        )
+    }
+
+def main():
+    import argparse
+    from utils import DATASET_PATH, convert_dataset_to_columnar
+
+    parser = argparse.ArgumentParser(description="Convert the restaurant CSV into a columnar store")
+    parser.add_argument("path", nargs="?", default=DATASET_PATH, help="CSV dataset to convert")
+    args = parser.parse_args()
+
+    store_dir = convert_dataset_to_columnar(args.path)
+    print(f"Wrote {store_dir}")
+
+if __name__ == "__main__":
+    main()
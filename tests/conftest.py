@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import DATASET_PATH, clear_dataset_cache, clear_query_cache
+
+# Rows of the bundled dataset used as a small test catalog
+SAMPLE_ROWS = 400
+
+@pytest.fixture
+def dataset_path(tmp_path):
+    """
+    Path of a small CSV catalog taken from the bundled dataset
+    """
+    path = tmp_path / "Dataset .csv"
+    pd.read_csv(os.path.join(ROOT, DATASET_PATH), nrows=SAMPLE_ROWS).to_csv(path, index=False)
+    yield str(path)
+    clear_dataset_cache()
+    clear_query_cache()
@@ -0,0 +1,42 @@
+import pytest
+
+from api import create_app
+from utils import KEY_COLUMN, load_and_process_data
+
+@pytest.fixture
+def client(dataset_path, tmp_path):
+    app = create_app(dataset_path, str(tmp_path / "model.joblib"), batch_max_size=1)
+    return app.test_client()
+
+@pytest.mark.parametrize('payload', [
+    [1, 2],
+    "hello",
+    {'cuisines': ['indian'], 'city': 'New Delhi'},
+    {'cuisines': 'indian', 'city': 7},
+    {'cuisines': 'indian', 'city': 'New Delhi', 'cost': 'cheap'},
+    {'cuisines': 'indian', 'city': 'New Delhi', 'has_table_booking': 'maybe'}
+])
+def test_predict_rejects_malformed_records(client, payload):
+    response = client.post('/predict', json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+@pytest.mark.parametrize('payload', [
+    [1, 2],
+    {'preferred_cuisines': [1]},
+    {'preferred_cuisines': ['cafe'], 'city': ['New Delhi']},
+    {'preferred_cuisines': ['cafe'], 'max_budget': 'cheap'},
+    {'preferred_cuisines': ['cafe'], 'min_rating': None}
+])
+def test_recommend_rejects_malformed_preferences(client, payload):
+    assert client.post('/recommend', json=payload).status_code == 400
+
+def test_recommend_accepts_valid_preferences(client):
+    response = client.post('/recommend', json={'preferred_cuisines': ['cafe'], 'max_budget': 800, 'city': 'New Delhi'})
+    assert response.status_code == 200
+
+def test_similar_rejects_non_integer_id(client, dataset_path):
+    assert client.get('/similar?id=abc').status_code == 400
+    assert client.get('/similar?position=abc').status_code == 400
+    missing = int(load_and_process_data(dataset_path)[KEY_COLUMN].max()) + 1
+    assert client.get(f'/similar?id={missing}').status_code == 404
@@ -0,0 +1,83 @@
+import asyncio
+
+import numpy as np
+
+from batching_utils import ModelNotReadyError, PredictionBatcher
+
+class RecordingPredictor:
+    """
+    Predicts each record's 'value', failing on records marked 'bad'
+    """
+    def __init__(self):
+        self.calls = []
+
+    def predict_fast(self, records):
+        self.calls.append(len(records))
+        if any(record.get('bad') for record in records):
+            raise ValueError("bad record")
+        return np.array([record['value'] for record in records], dtype=float)
+
+def _requests(*sizes):
+    start = 0
+    requests = []
+    for size in sizes:
+        requests.append([{'value': start + i} for i in range(size)])
+        start += size
+    return requests
+
+def _run(batcher, requests):
+    async def main():
+        try:
+            return await asyncio.gather(*(batcher.predict(r) for r in requests), return_exceptions=True)
+        finally:
+            batcher.close()
+    return asyncio.run(main())
+
+def test_concurrent_requests_are_batched():
+    predictor = RecordingPredictor()
+    batcher = PredictionBatcher(lambda: predictor, max_batch_size=64, max_wait_ms=50)
+    requests = _requests(1, 2, 3, 4)
+
+    results = _run(batcher, requests)
+    assert [r.tolist() for r in results] == [[record['value'] for record in r] for r in requests]
+    assert predictor.calls == [10]
+    assert batcher.stats()['batches'] == 1
+    assert batcher.stats()['predicted_rows'] == 10
+
+def test_batches_never_exceed_max_batch_size():
+    predictor = RecordingPredictor()
+    batcher = PredictionBatcher(lambda: predictor, max_batch_size=4, max_wait_ms=50)
+    requests = _requests(3, 3, 10)
+
+    results = _run(batcher, requests)
+    assert [r.tolist() for r in results] == [[record['value'] for record in r] for r in requests]
+    assert max(predictor.calls) <= 4
+    assert sum(predictor.calls) == 16
+    assert batcher.stats()['predicted_rows'] == 16
+
+def test_failing_request_does_not_fail_the_batch():
+    predictor = RecordingPredictor()
+    batcher = PredictionBatcher(lambda: predictor, max_batch_size=64, max_wait_ms=50)
+    good, other = _requests(2, 3)
+
+    results = _run(batcher, [good, [{'value': 0, 'bad': True}], other])
+    assert results[0].tolist() == [0, 1]
+    assert isinstance(results[1], ValueError)
+    assert results[2].tolist() == [2, 3, 4]
+    # The failed batch, then each request on its own
+    assert predictor.calls == [6, 2, 1, 3]
+    assert batcher.stats()['batches'] == 2
+    assert batcher.stats()['predicted_rows'] == 5
+
+def test_requests_fail_while_no_model_is_ready():
+    batcher = PredictionBatcher(lambda: None, max_wait_ms=1)
+    results = _run(batcher, _requests(1, 2))
+    assert all(isinstance(result, ModelNotReadyError) for result in results)
+
+def test_predict_sync_from_threads():
+    predictor = RecordingPredictor()
+    batcher = PredictionBatcher(lambda: predictor, max_wait_ms=1)
+    try:
+        assert batcher.predict_sync([{'value': 3.0}], timeout=5).tolist() == [3.0]
+    finally:
+        batcher.close()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+import utils
+from cache_utils import QueryCache
+from index_utils import split_cuisines
+from utils import (
+    filter_restaurants, get_query_cache_stats, get_restaurant_recommendations, load_and_process_data,
+    search_restaurants
+)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get_or_compute('a', lambda: None) == 1
+    cache.put('c', 3)
+
+    assert cache.get_or_compute('a', lambda: None) == 1
+    assert cache.get_or_compute('b', lambda: 'recomputed') == 'recomputed'
+    assert cache.stats()['evictions'] == 2
+
+def test_byte_limit_evicts_and_skips_oversized_values():
+    cache = QueryCache(max_bytes=1000)
+    cache.put('a', np.zeros(70))
+    cache.put('b', np.zeros(70))
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == 560
+
+    cache.put('big', np.zeros(200))
+    assert cache.stats()['entries'] == 1
+    assert cache.get_or_compute('big', lambda: 'recomputed') == 'recomputed'
+
+    # Frames are sized with their strings
+    frame = pd.DataFrame({'name': ['x' * 100] * 20})
+    cache = QueryCache(max_bytes=10000)
+    cache.put('frame', frame)
+    assert cache.stats()['bytes'] == frame.memory_usage(deep=True).sum() > 2000
+
+def test_cached_arrays_are_read_only():
+    cache = QueryCache()
+    value = cache.get_or_compute('rows', lambda: np.arange(5))
+    assert not value.flags.writeable
+
+def test_cache_hits_reuse_formatted_results(dataset_path, monkeypatch):
+    df = load_and_process_data(dataset_path)
+    formatted = []
+    format_display = utils._format_display
+    monkeypatch.setattr(utils, '_format_display', lambda rows: formatted.append(len(rows)) or format_display(rows))
+
+    first = filter_restaurants(df, 'American')
+    first['Cost'] = 'changed'
+    again = filter_restaurants(df, ' american ')
+    assert formatted == [len(first)]
+    assert (again['Cost'] != 'changed').all()
+
+    preferences = {'preferred_cuisines': ['italian'], 'max_budget': 800}
+    recommendations = get_restaurant_recommendations(df, preferences)
+    assert get_restaurant_recommendations(df, preferences).equals(recommendations)
+    assert len(formatted) == 2
+
+def test_reload_invalidates_cached_results(dataset_path):
+    df = load_and_process_data(dataset_path)
+    assert search_restaurants(df, 'italian').total > 0
+    assert get_query_cache_stats()['entries'] > 0
+
+    pd.read_csv(dataset_path).iloc[:50].to_csv(dataset_path, index=False)
+    reloaded = load_and_process_data(dataset_path)
+    assert get_query_cache_stats()['entries'] == 0
+    expected = sum('italian' in split_cuisines(value) for value in reloaded['Cuisines'])
+    assert search_restaurants(reloaded, 'italian').total == expected
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from index_utils import PrefixIndex, RestaurantIndex, split_cuisines, top_k_positions
+from utils import get_restaurant_recommendations, load_and_process_data
+
+PROFILES = [
+    {'preferred_cuisines': ['italian'], 'max_budget': 500, 'min_rating': 3.5},
+    {'preferred_cuisines': ['north indian', 'chinese'], 'max_budget': 1000},
+    {'preferred_cuisines': ['cafe'], 'min_rating': 4.0},
+    {'preferred_cuisines': ['unknown cuisine'], 'max_budget': 500}
+]
+
+def test_rows_for_cuisine_matches_scan(dataset_path):
+    df = load_and_process_data(dataset_path)
+    index = RestaurantIndex(df)
+    for cuisine in ['italian', 'north indian', 'cafe', 'unknown cuisine']:
+        expected = [i for i, value in enumerate(df['Cuisines']) if cuisine in split_cuisines(value)]
+        assert index.rows_for_cuisine(cuisine).tolist() == expected
+
+def test_top_k_positions_matches_nlargest():
+    scores = np.array([1.0, 5.0, np.nan, 5.0, 3.0, 2.0, 5.0, 0.5])
+    expected = pd.Series(scores).nlargest(4, keep='first').index.tolist()
+    assert top_k_positions(scores, 4).tolist() == expected
+    assert top_k_positions(scores, 20).tolist() == pd.Series(scores).dropna().sort_values(
+        ascending=False, kind='stable').index.tolist()
+    assert top_k_positions(scores, 0).tolist() == []
+
+def test_recommendations_match_row_by_row_scoring(dataset_path):
+    df = load_and_process_data(dataset_path)
+    preferences = {'preferred_cuisines': ['cafe', 'north indian'], 'max_budget': 800, 'min_rating': 3.0}
+
+    # Reference scoring of every row, as a loop over the frame would do it
+    scores = []
+    for cuisines, rating, cost in zip(df['Cuisines'], df['Aggregate rating'], df['Average Cost for two']):
+        score = 30 * len(set(preferences['preferred_cuisines']) & set(split_cuisines(cuisines)))
+        score += (rating - preferences['min_rating']) * 8
+        score += max(30 * (1 - cost / (preferences['max_budget'] * 2)), 0)
+        scores.append(score)
+    expected = pd.Series(scores).nlargest(10, keep='first').index
+
+    recommendations = get_restaurant_recommendations(df, preferences)
+    assert recommendations['Restaurant Name'].tolist() == df['Restaurant Name'].iloc[expected].tolist()
+
+def test_batch_top_k_matches_single_profile_ranking(dataset_path):
+    df = load_and_process_data(dataset_path)
+    index = RestaurantIndex(df)
+    for scope in [index, index.for_city(df['City'].iloc[0])]:
+        for k in [0, 1, 10, 1000]:
+            for profile, top in zip(PROFILES, scope.batch_top_k(PROFILES, k)):
+                scores = scope.recommendation_scores(
+                    profile['preferred_cuisines'], profile.get('max_budget', float('inf')), profile.get('min_rating', 0)
+                )
+                assert top.tolist() == top_k_positions(scores, k).tolist()
+
+def test_city_partition_matches_filter(dataset_path):
+    df = load_and_process_data(dataset_path)
+    index = RestaurantIndex(df)
+    city = df['City'].iloc[0]
+    partition = index.for_city(city.upper())
+
+    expected_rows = np.flatnonzero((df['City'] == city).to_numpy())
+    assert partition.rows.tolist() == expected_rows.tolist()
+    full = index.recommendation_scores(['cafe'], 800, 3.0)
+    np.testing.assert_allclose(partition.recommendation_scores(['cafe'], 800, 3.0), full[expected_rows])
+    assert len(index.for_city('nowhere').rows) == 0
+
+def test_prefix_index_ranks_by_count():
+    index = PrefixIndex({'indian': 3, 'north indian': 5, 'italian': 4, 'chinese': 1})
+    assert index.suggest('ind') == [('north indian', 5), ('indian', 3)]
+    assert index.suggest('i', limit=2) == [('north indian', 5), ('italian', 4)]
+    assert index.suggest('x') == []
@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from ml_utils import ModelManager, RestaurantRatingPredictor, dataset_fingerprint
+from utils import clear_dataset_cache, convert_dataset_to_columnar, load_and_process_data
+
+def _records(df):
+    return [
+        {
+            'Cuisines': cuisines,
+            'City': city,
+            'Average Cost for two': float(cost),
+            'Has Table booking': booking,
+            'Has Online delivery': delivery
+        }
+        for cuisines, city, cost, booking, delivery in zip(
+            df['Cuisines'], df['City'], df['Average Cost for two'],
+            df['Has Table booking'], df['Has Online delivery']
+        )
+    ]
+
+def test_fast_path_matches_predict(dataset_path):
+    df = load_and_process_data(dataset_path)
+    predictor = RestaurantRatingPredictor(n_estimators=10, n_jobs=1)
+    predictor.fit(df)
+
+    sample = df.iloc[:40]
+    expected = predictor.predict(sample)
+    records = _records(sample)
+    # Small batches walk the trees directly, larger ones go through sklearn
+    np.testing.assert_allclose(predictor.predict_fast(records[:5]), expected[:5])
+    np.testing.assert_allclose(predictor.predict_fast(records), expected)
+
+def test_fast_path_handles_unseen_values(dataset_path):
+    df = load_and_process_data(dataset_path)
+    predictor = RestaurantRatingPredictor(n_estimators=10, n_jobs=1)
+    predictor.fit(df)
+
+    record = _records(df.iloc[:1])[0]
+    record.update({'Cuisines': 'klingon', 'City': 'Atlantis'})
+    expected = predictor.predict(pd.DataFrame.from_records([record]))
+    np.testing.assert_allclose(predictor.predict_fast([record]), expected)
+
+def test_fast_path_lowercases_cuisines(dataset_path):
+    df = load_and_process_data(dataset_path)
+    predictor = RestaurantRatingPredictor(n_estimators=10, n_jobs=1)
+    predictor.fit(df)
+
+    records = _records(df.iloc[:20])
+    shouted = [dict(record, Cuisines=record['Cuisines'].upper()) for record in records]
+    np.testing.assert_allclose(predictor.predict_fast(shouted), predictor.predict_fast(records))
+
+def test_model_manager_trains_each_dataset_once(dataset_path, tmp_path):
+    df = load_and_process_data(dataset_path)
+    older, newer = df.iloc[:300], df.iloc[100:]
+    manager = ModelManager(str(tmp_path / "model.joblib"), n_estimators=5, n_jobs=1)
+
+    # Train in a thread instead of a spawned process, recording each job
+    submitted = []
+    executor = ThreadPoolExecutor(max_workers=1)
+    def submit(job, frame, *args):
+        submitted.append(len(frame))
+        return executor.submit(job, frame, *args)
+    manager._executor = SimpleNamespace(submit=submit)
+
+    assert manager.get(older) is None
+    manager.get(newer)
+    predictor = manager.wait(newer, timeout=60)
+    for _ in range(5):
+        manager.get(newer)
+
+    assert submitted == [len(older), len(newer)]
+    assert predictor is not None and manager.status == 'ready'
+    assert predictor.data_fingerprint == dataset_fingerprint(newer)
+    executor.shutdown()
+
+def test_fingerprint_ignores_load_path(dataset_path):
+    csv_fingerprint = dataset_fingerprint(load_and_process_data(dataset_path))
+    assert dataset_fingerprint(load_and_process_data(dataset_path, compact=True)) == csv_fingerprint
+
+    convert_dataset_to_columnar(dataset_path)
+    clear_dataset_cache()
+    columnar = load_and_process_data(dataset_path)
+    assert columnar['Aggregate rating'].dtype == np.float32
+    assert dataset_fingerprint(columnar) == csv_fingerprint
+
+    changed = columnar.copy()
+    changed.loc[0, 'Aggregate rating'] = 1.0
+    assert dataset_fingerprint(changed) != csv_fingerprint
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from index_utils import get_restaurant_index, top_k_positions
+from similarity_utils import SimilarityIndex, get_similarity_index
+from utils import KEY_COLUMN, apply_dataset_updates, get_similar_restaurants, load_and_process_data
+
+def test_scores_match_pairwise_cosine_similarity(dataset_path):
+    df = load_and_process_data(dataset_path)
+    similarity = SimilarityIndex(df, get_restaurant_index(df))
+
+    embedding = np.hstack([similarity.sparse.toarray(), similarity.dense])
+    expected = embedding[[0, 7]] @ embedding.T
+    expected[0, 0] = expected[1, 7] = np.nan
+    np.testing.assert_allclose(similarity.scores([0, 7]), expected, atol=1e-12)
+
+    rows = get_restaurant_index(df).for_city(df['City'].iloc[0]).rows
+    np.testing.assert_allclose(similarity.scores([0], rows)[0], expected[0, rows], atol=1e-12)
+
+def test_similar_restaurants_are_ranked_by_similarity(dataset_path):
+    df = load_and_process_data(dataset_path)
+    scores = get_similarity_index(df).scores([0])[0]
+    expected = top_k_positions(scores, 5)
+
+    similar = get_similar_restaurants(df, 0, top_k=5)
+    assert similar['Restaurant Name'].tolist() == df['Restaurant Name'].iloc[expected].tolist()
+    assert similar['Similarity'].is_monotonic_decreasing
+    assert similar['Similarity'].between(0, 1).all()
+
+def test_closed_restaurants_are_never_similar(dataset_path):
+    df = load_and_process_data(dataset_path)
+    best = int(top_k_positions(get_similarity_index(df).scores([0])[0], 1)[0])
+
+    patched = apply_dataset_updates(
+        pd.DataFrame.from_records([{KEY_COLUMN: int(df[KEY_COLUMN].iloc[best]), 'Closed': 'Yes'}]), dataset_path
+    )
+    scores = get_similarity_index(patched).scores([0])[0]
+    assert np.isnan(scores[best])
+    assert best not in top_k_positions(scores, len(patched)).tolist()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+import storage_utils
+from index_utils import RestaurantIndex, get_restaurant_index
+from storage_utils import load_columnar, load_columnar_index
+from utils import _read_dataset, convert_dataset_to_columnar, load_and_process_data
+
+def _convert_in_small_chunks(dataset_path, monkeypatch):
+    # Several chunks on append, and several when finishing the index arrays
+    monkeypatch.setattr(storage_utils, 'FINISH_CHUNK_ROWS', 37)
+    return convert_dataset_to_columnar(dataset_path, chunksize=50)
+
+def test_columnar_round_trip_across_chunks(dataset_path, monkeypatch):
+    store_dir = _convert_in_small_chunks(dataset_path, monkeypatch)
+    expected = _read_dataset(dataset_path)
+    loaded = load_columnar(store_dir)
+
+    assert list(loaded.columns) == list(expected.columns)
+    for column in expected.columns:
+        if pd.api.types.is_numeric_dtype(expected[column]):
+            assert np.allclose(loaded[column].astype(float), expected[column].astype(float), equal_nan=True)
+        else:
+            assert loaded[column].astype(object).tolist() == expected[column].astype(object).tolist()
+
+def test_stored_index_matches_fresh_build(dataset_path, monkeypatch):
+    store_dir = _convert_in_small_chunks(dataset_path, monkeypatch)
+    df = load_columnar(store_dir)
+    fresh = RestaurantIndex(_read_dataset(dataset_path))
+    stored = RestaurantIndex(df, load_columnar_index(store_dir))
+
+    for cuisine in fresh.cuisine_vocab:
+        assert stored.rows_for_cuisine(cuisine).tolist() == fresh.rows_for_cuisine(cuisine).tolist()
+    for city in fresh.city_ids:
+        assert stored.for_city(city).rows.tolist() == fresh.for_city(city).rows.tolist()
+    assert np.allclose(
+        stored.recommendation_scores(['north indian', 'cafe'], 800, 3),
+        fresh.recommendation_scores(['north indian', 'cafe'], 800, 3),
+        equal_nan=True
+    )
+
+    assert stored.metadata['cuisine_counts'].equals(fresh.metadata['cuisine_counts'])
+    assert stored.metadata['city_counts'].to_dict() == fresh.metadata['city_counts'].to_dict()
+    assert list(stored.metadata['city_counts'].index) == list(fresh.metadata['city_counts'].index)
+    for histogram in ['rating_histogram', 'cost_histogram']:
+        assert stored.metadata[histogram][0].tolist() == fresh.metadata[histogram][0].tolist()
+        assert np.allclose(stored.metadata[histogram][1], fresh.metadata[histogram][1])
+
+def test_loading_a_store_uses_its_index(dataset_path, monkeypatch):
+    convert_dataset_to_columnar(dataset_path)
+    monkeypatch.setattr(RestaurantIndex, '_cuisine_rows', None)
+    df = load_and_process_data(dataset_path)
+    assert isinstance(get_restaurant_index(df)._postings, np.memmap)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from index_utils import get_restaurant_index
+from text_search_utils import TextSearchIndex, _text_indexes, get_text_index, normalize_text, trigrams
+from utils import KEY_COLUMN, apply_dataset_updates, load_and_process_data
+
+def test_normalize_text_strips_accents_and_case():
+    assert normalize_text("Café Déjà-Vu, 12 Main St.") == ['cafe', 'deja', 'vu', '12', 'main', 'st']
+    assert normalize_text(np.nan) == []
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+
+def test_exact_typo_and_prefix_matches(dataset_path):
+    df = load_and_process_data(dataset_path)
+    text_index = get_text_index(df)
+    name = df['Restaurant Name'].iloc[0]
+    word = max(normalize_text(name), key=len)
+
+    exact = text_index.search(word)[0]
+    assert 0 in exact
+    # A dropped letter still matches, and so does a word being typed
+    typo = word[:2] + word[3:]
+    assert 0 in text_index.search(typo)[0]
+    assert 0 in text_index.search(word[:4])[0]
+    assert len(text_index.search('qqqzzzxxx')[0]) == 0
+
+def test_search_respects_rows(dataset_path):
+    df = load_and_process_data(dataset_path)
+    text_index = get_text_index(df)
+    positions, scores = text_index.search('cafe')
+    assert len(positions) > 1 and np.all(np.diff(scores) <= 0)
+    rows = positions[1::2]
+    assert set(text_index.search('cafe', rows)[0]) == set(rows)
+
+def test_updates_patch_the_text_index(dataset_path):
+    df = load_and_process_data(dataset_path)
+    get_text_index(df)
+    record = df.iloc[2].to_dict()
+    record.update({KEY_COLUMN: 999999999, 'Restaurant Name': 'Zanzibarista Gelato Lab'})
+    patched = apply_dataset_updates(pd.DataFrame.from_records([
+        {KEY_COLUMN: int(df[KEY_COLUMN].iloc[0]), 'Restaurant Name': 'Quokka Kitchen'},
+        {KEY_COLUMN: int(df[KEY_COLUMN].iloc[1]), 'Closed': 'Yes'},
+        record
+    ]), dataset_path)
+
+    # Carried over by the update, not rebuilt by the first search
+    assert get_restaurant_index(patched) in _text_indexes
+    fresh = TextSearchIndex(patched, get_restaurant_index(patched))
+    text_index = get_text_index(patched)
+    for query in ['quokka', 'zanzibar', 'gelato lab', 'cafe', 'pizza', df['Restaurant Name'].iloc[1]]:
+        positions, scores = text_index.search(query)
+        expected_positions, expected_scores = fresh.search(query)
+        assert positions.tolist() == expected_positions.tolist()
+        np.testing.assert_allclose(scores, expected_scores)
+    assert text_index.search('quokka')[0].tolist() == [0]
+    assert text_index.search('zanzibarista')[0].tolist() == [len(patched) - 1]
+    assert 1 not in text_index.search(df['Restaurant Name'].iloc[1])[0]
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from index_utils import RestaurantIndex, get_restaurant_index
+from utils import KEY_COLUMN, apply_dataset_updates, load_and_process_data, search_restaurants
+
+def _new_restaurant(df, key):
+    record = df.iloc[2].to_dict()
+    record[KEY_COLUMN] = key
+    record['Cuisines'] = 'Martian'
+    return record
+
+def test_mixed_delta_only_writes_given_fields(dataset_path):
+    df = load_and_process_data(dataset_path)
+    before = df.iloc[:2].copy()
+    key0, key1 = int(df[KEY_COLUMN].iloc[0]), int(df[KEY_COLUMN].iloc[1])
+
+    patched = apply_dataset_updates(pd.DataFrame.from_records([
+        {KEY_COLUMN: key0, 'Cuisines': 'Klingon'},
+        {KEY_COLUMN: key1, 'Aggregate rating': 1.0},
+        _new_restaurant(df, 999999999)
+    ]), dataset_path)
+
+    assert len(patched) == len(df) + 1
+    assert patched['Cuisines'].iloc[0] == 'klingon'
+    assert patched['Aggregate rating'].iloc[0] == before['Aggregate rating'].iloc[0]
+    assert patched['Restaurant Name'].iloc[0] == before['Restaurant Name'].iloc[0]
+    assert patched['Aggregate rating'].iloc[1] == 1.0
+    assert patched['Cuisines'].iloc[1] == before['Cuisines'].iloc[1]
+    assert patched['Cuisines'].iloc[-1] == 'martian'
+    assert patched['Average Cost for two'].dtype == df['Average Cost for two'].dtype
+
+def test_patched_index_matches_rebuilt_index(dataset_path):
+    df = load_and_process_data(dataset_path)
+    keys = df[KEY_COLUMN].to_numpy()
+    patched = apply_dataset_updates(pd.DataFrame.from_records([
+        {KEY_COLUMN: int(keys[0]), 'Cuisines': 'Cafe, Klingon', 'City': df['City'].iloc[5]},
+        {KEY_COLUMN: int(keys[3]), 'Closed': 'Yes'},
+        _new_restaurant(df, 999999999)
+    ]), dataset_path)
+
+    patched_index = get_restaurant_index(patched)
+    rebuilt = RestaurantIndex(patched)
+    for cuisine in ['cafe', 'klingon', 'martian', 'italian']:
+        expected = [row for row in rebuilt.rows_for_cuisine(cuisine) if row != 3]
+        assert patched_index.rows_for_cuisine(cuisine).tolist() == expected
+
+    scores = patched_index.recommendation_scores(['cafe', 'klingon'], 800, 3.0)
+    expected = rebuilt.recommendation_scores(['cafe', 'klingon'], 800, 3.0)
+    expected[3] = np.nan
+    np.testing.assert_allclose(scores, expected)
+    assert patched_index.metadata['restaurants'] == len(patched) - 1
+
+def test_closed_restaurant_leaves_search(dataset_path):
+    df = load_and_process_data(dataset_path)
+    cuisine = df['Cuisines'].iloc[0].split(',')[0]
+    name = df['Restaurant Name'].iloc[0]
+    assert name in search_restaurants(df, cuisine, page_size=1000).page(0)['Restaurant Name'].tolist()
+
+    patched = apply_dataset_updates(
+        pd.DataFrame.from_records([{KEY_COLUMN: int(df[KEY_COLUMN].iloc[0]), 'Closed': 'Yes'}]), dataset_path
+    )
+    assert name not in search_restaurants(patched, cuisine, page_size=1000).page(0)['Restaurant Name'].tolist()
+
+def test_new_restaurant_needs_required_columns(dataset_path):
+    load_and_process_data(dataset_path)
+    with pytest.raises(ValueError):
+        apply_dataset_updates(pd.DataFrame.from_records([{KEY_COLUMN: 999999999, 'Cuisines': 'Cafe'}]), dataset_path)
+
+def test_closed_restaurant_stays_closed_until_reopened(dataset_path):
+    df = load_and_process_data(dataset_path)
+    key = int(df[KEY_COLUMN].iloc[0])
+    cuisine = df['Cuisines'].iloc[0].split(',')[0]
+    name = df['Restaurant Name'].iloc[0]
+
+    def listed(frame):
+        return name in search_restaurants(frame, cuisine, page_size=1000).page(0)['Restaurant Name'].tolist()
+
+    apply_dataset_updates(pd.DataFrame.from_records([{KEY_COLUMN: key, 'Closed': 'Yes'}]), dataset_path)
+    patched = apply_dataset_updates(pd.DataFrame.from_records([{KEY_COLUMN: key, 'Aggregate rating': 4.9}]), dataset_path)
+    assert not listed(patched)
+    assert patched['Aggregate rating'].iloc[0] == pytest.approx(4.9)
+    assert np.isnan(get_restaurant_index(patched).recommendation_scores([cuisine])[0])
+
+    reopened = apply_dataset_updates(pd.DataFrame.from_records([{KEY_COLUMN: key, 'Closed': 'No'}]), dataset_path)
+    assert listed(reopened)
+    assert get_restaurant_index(reopened).recommendation_scores([cuisine])[0] > 0
@@ -0,0 +1,28 @@
+import os
+
+import pandas as pd
+
+import utils
+from utils import load_and_process_data
+
+def test_dataset_is_parsed_once_until_it_changes(dataset_path, monkeypatch):
+    reads = []
+    read_dataset = utils._read_dataset
+    monkeypatch.setattr(utils, '_read_dataset', lambda path: reads.append(path) or read_dataset(path))
+
+    df = load_and_process_data(dataset_path)
+    assert load_and_process_data(dataset_path) is df
+    assert len(reads) == 1
+
+    # A new modification time with the same content keeps the cached frame
+    stat = os.stat(dataset_path)
+    os.utime(dataset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_and_process_data(dataset_path) is df
+    assert len(reads) == 1
+
+    # Changed content is parsed again
+    pd.read_csv(dataset_path).iloc[:100].to_csv(dataset_path, index=False)
+    reloaded = load_and_process_data(dataset_path)
+    assert reloaded is not df
+    assert len(reloaded) == 100
+    assert len(reads) == 2
@@ -0,0 +1,294 @@
+import copy
+import re
+import threading
+import unicodedata
+import weakref
+
+import pandas as pd
+import numpy as np
+from scipy import sparse
+
+from index_utils import get_restaurant_index
+from metrics_utils import timer
+
+# Searchable columns and how much a match in each counts
+TEXT_FIELDS = {
+    'Restaurant Name': 3.0,
+    'Cuisines': 2.0,
+    'Address': 1.0
+}
+
+# Minimum trigram similarity (Dice coefficient) for a word to match a
+# misspelled query word
+TYPO_THRESHOLD = 0.5
+
+# Vocabulary words considered per query word
+MAX_WORD_MATCHES = 20
+
+_WORD_PATTERN = re.compile(r'[0-9a-z]+')
+
+# Text indexes for live restaurant indexes: RestaurantIndex -> TextSearchIndex
+_text_indexes = weakref.WeakKeyDictionary()
+_text_lock = threading.Lock()
+
+def normalize_text(value):
+    """
+    Lowercase ASCII words of a string, with accents removed
+    """
+    if not isinstance(value, str):
+        return []
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    return _WORD_PATTERN.findall(value.lower())
+
+def trigrams(word):
+    """
+    Distinct trigrams of a word padded like '  word ', so short words and
+    word starts get trigrams too
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _best_per_key(keys, values):
+    """
+    Distinct keys, sorted, each with its highest value
+    """
+    order = np.lexsort((-values, keys))
+    keys, values = keys[order], values[order]
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+    return keys[first], values[first]
+
+class TextSearchIndex:
+    """
+    Inverted word index over restaurant names, cuisines and addresses, with
+    a trigram index over the word vocabulary for typo tolerance
+
+    Query words are matched exactly, as prefixes (so results appear while
+    typing) and by trigram similarity (so misspellings still match). Each
+    query word contributes its best match in a restaurant, weighted by
+    match similarity, inverse document frequency and field, and restaurants
+    are ranked by the sum over query words, then by rating.
+    Only the postings of matched words are touched, never every row.
+    """
+    def __init__(self, df, index):
+        self.n_rows = 0
+        self.words = np.empty(0, dtype=object)
+        self.word_ids = {}
+        self._sorted_ids = np.empty(0, dtype=np.int64)
+        self._sorted_words = self.words
+        self.word_gram_counts = np.empty(0, dtype=np.int32)
+        self.gram_ids = {}
+        self.postings = {
+            column: (np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32)) for column in TEXT_FIELDS
+        }
+        self._gram_indptr = np.zeros(1, dtype=np.int64)
+        self._gram_words = np.empty(0, dtype=np.int32)
+        self._index_rows(df, index, np.arange(len(df)))
+
+    def updated(self, df, index, touched):
+        """
+        Text index for df, a patched copy of this index's frame (see
+        RestaurantIndex.updated); only the rows at positions touched, which
+        include any appended rows, are tokenized again
+        """
+        text_index = copy.copy(self)
+        text_index._index_rows(df, index, np.asarray(touched, dtype=np.int64))
+        return text_index
+
+    def _index_rows(self, df, index, rows):
+        """
+        Replace the postings of the rows at positions rows with their
+        current words, adding new words to the vocabulary
+        """
+        n_rows = len(df)
+        replaced = np.zeros(n_rows, dtype=bool)
+        replaced[rows] = True
+
+        # Tokenize each distinct string of each field only once
+        field_tokens = {}
+        for column in TEXT_FIELDS:
+            codes, uniques = pd.factorize(df[column].iloc[rows], use_na_sentinel=True)
+            field_tokens[column] = (codes, [normalize_text(value) for value in uniques])
+
+        new_words = sorted({
+            word for _, tokens in field_tokens.values() for words in tokens for word in words
+        } - self.word_ids.keys())
+        if new_words:
+            self._add_words(new_words)
+        n_words = len(self.words)
+
+        # Row x word matrices per field, stored by word so postings are columns
+        postings = {}
+        document_frequency = np.zeros(n_words)
+        for column, (codes, tokens) in field_tokens.items():
+            unique_words = [sorted({self.word_ids[word] for word in words}) for words in tokens]
+            lengths = np.array([len(ids) for ids in unique_words] + [0], dtype=np.int64)
+            word_starts = np.concatenate([[0], np.cumsum(lengths)])
+            # Missing values pick the empty last entry
+            codes = np.where(codes < 0, len(tokens), codes)
+            flat_words = np.array([i for ids in unique_words for i in ids], dtype=np.int32)
+            row_lengths = lengths[codes]
+            new_rows = np.repeat(rows, row_lengths)
+            offsets = np.arange(row_lengths.sum()) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+            new_words_of_rows = flat_words[np.repeat(word_starts[codes], row_lengths) + offsets]
+
+            # Keep the postings of the other rows
+            indptr, indices = self.postings[column]
+            old_words = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+            kept = ~replaced[indices]
+
+            by_word = sparse.csc_matrix(
+                (
+                    np.ones(kept.sum() + len(new_rows), dtype=np.int8),
+                    (np.concatenate([indices[kept], new_rows]), np.concatenate([old_words[kept], new_words_of_rows]))
+                ),
+                shape=(n_rows, n_words)
+            )
+            by_word.sort_indices()
+            postings[column] = (by_word.indptr, by_word.indices)
+            document_frequency += np.diff(by_word.indptr)
+
+        self.n_rows = n_rows
+        self.postings = postings
+        self.idf = np.log1p(n_rows / np.maximum(document_frequency, 1))
+        self.excluded = index.closed.copy()
+        self.ratings = index.ratings
+
+    def _add_words(self, new_words):
+        """
+        Append words to the vocabulary and the trigram index
+        """
+        first_id = len(self.words)
+        self.words = np.concatenate([self.words, np.array(new_words, dtype=object)])
+        self.word_ids = dict(self.word_ids)
+        self.word_ids.update((word, first_id + i) for i, word in enumerate(new_words))
+        # Vocabulary ids in word order, so prefix matches are a contiguous range
+        self._sorted_ids = np.argsort(self.words, kind='stable')
+        self._sorted_words = self.words[self._sorted_ids]
+
+        # Trigram -> word ids, and the trigram count of every word
+        gram_ids = dict(self.gram_ids)
+        gram_rows, gram_words = [], []
+        gram_counts = np.zeros(len(new_words), dtype=np.int32)
+        for i, word in enumerate(new_words):
+            grams = trigrams(word)
+            gram_counts[i] = len(grams)
+            for gram in grams:
+                gram_rows.append(gram_ids.setdefault(gram, len(gram_ids)))
+                gram_words.append(first_id + i)
+        self.word_gram_counts = np.concatenate([self.word_gram_counts, gram_counts])
+
+        old_grams = np.repeat(np.arange(len(self._gram_indptr) - 1), np.diff(self._gram_indptr))
+        by_gram = sparse.csr_matrix(
+            (
+                np.ones(len(old_grams) + len(gram_rows), dtype=np.int8),
+                (np.concatenate([old_grams, gram_rows]).astype(np.int64),
+                 np.concatenate([self._gram_words, gram_words]).astype(np.int64))
+            ),
+            shape=(len(gram_ids), len(self.words))
+        )
+        by_gram.sort_indices()
+        self.gram_ids = gram_ids
+        self._gram_indptr = by_gram.indptr
+        self._gram_words = by_gram.indices
+
+    def match_words(self, word, prefix=False):
+        """
+        Vocabulary word ids matching a query word, with similarities in (0, 1]
+        """
+        # Trigram similarity to every word sharing at least one trigram
+        query_grams = [self.gram_ids[gram] for gram in trigrams(word) if gram in self.gram_ids]
+        candidates = np.concatenate(
+            [self._gram_words[self._gram_indptr[g]:self._gram_indptr[g + 1]] for g in query_grams]
+            or [np.empty(0, dtype=np.int32)]
+        )
+        ids, shared = np.unique(candidates, return_counts=True)
+        similarity = 2 * shared / (len(trigrams(word)) + self.word_gram_counts[ids])
+        keep = similarity >= TYPO_THRESHOLD
+        ids, similarity = ids[keep], similarity[keep]
+
+        if prefix:
+            # Words the query word is the start of, scored by how much of them is typed
+            start, end = np.searchsorted(self._sorted_words, [word, word + '\uffff'])
+            prefix_ids = self._sorted_ids[start:end]
+            prefix_lengths = np.array([len(w) for w in self.words[prefix_ids]], dtype=np.float64)
+            prefix_similarity = 0.8 + 0.2 * len(word) / prefix_lengths
+            ids, similarity = _best_per_key(
+                np.concatenate([ids, prefix_ids]), np.concatenate([similarity, prefix_similarity])
+            )
+
+        order = np.argsort(-similarity, kind='stable')[:MAX_WORD_MATCHES]
+        return ids[order], similarity[order]
+
+    def search(self, query, rows=None):
+        """
+        Frame positions of restaurants matching query, best first, and their
+        scores; rows optionally restricts results to those frame positions
+        """
+        words = normalize_text(query)
+        matched_rows, matched_scores = [], []
+        for i, word in enumerate(words):
+            # The last word may still be being typed
+            ids, similarity = self.match_words(word, prefix=i == len(words) - 1)
+            if len(ids) == 0:
+                continue
+            # Weigh the word by the rarity of its best match, and sharply
+            # discount looser matches so they rank below exact ones
+            weights = similarity ** 3 * self.idf[ids[0]]
+
+            term_rows, term_scores = [], []
+            for column, field_weight in TEXT_FIELDS.items():
+                indptr, indices = self.postings[column]
+                counts = indptr[ids + 1] - indptr[ids]
+                term_rows.append(np.concatenate([indices[indptr[w]:indptr[w + 1]] for w in ids]))
+                term_scores.append(np.repeat(weights * field_weight, counts))
+            term_rows = np.concatenate(term_rows)
+            term_scores = np.concatenate(term_scores)
+            if len(term_rows) == 0:
+                continue
+
+            # A query word counts once per restaurant, with its best match
+            term_rows, term_scores = _best_per_key(term_rows, term_scores)
+            matched_rows.append(term_rows)
+            matched_scores.append(term_scores)
+
+        if not matched_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        positions, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+        keep = ~self.excluded[positions]
+        if rows is not None:
+            keep &= np.isin(positions, rows)
+        positions, scores = positions[keep].astype(np.int64), scores[keep]
+
+        # Equally relevant restaurants are ranked by rating
+        order = np.lexsort((positions, -self.ratings[positions], -scores))
+        return positions[order], scores[order]
+
+def get_text_index(df):
+    """
+    Return the text search index for df, building it the first time
+    """
+    index = get_restaurant_index(df)
+    with _text_lock:
+        text_index = _text_indexes.get(index)
+        if text_index is None:
+            with timer('text_index.build'):
+                text_index = TextSearchIndex(df, index)
+            _text_indexes[index] = text_index
+        return text_index
+
+def update_text_index(df, previous, index, touched):
+    """
+    Carry the text index of the RestaurantIndex previous over to index,
+    its patched successor for df, tokenizing only the rows at positions
+    touched; nothing happens if previous has no text index
+    """
+    with _text_lock:
+        text_index = _text_indexes.get(previous)
+    if text_index is None:
+        return
+    with timer('text_index.update'):
+        text_index = text_index.updated(df, index, touched)
+    with _text_lock:
+        _text_indexes.setdefault(index, text_index)
@@ -1,92 +1,680 @@
+import hashlib
+import importlib.util
+import os
+import threading
+
 import pandas as pd
 import numpy as np
 
-def load_and_process_data():
+from cache_utils import QueryCache
+from metrics_utils import timed, timer, increment
+from index_utils import RestaurantIndex, get_restaurant_index, register_restaurant_index, top_k_positions
+from similarity_utils import get_similarity_index, update_similarity_index
+from text_search_utils import get_text_index, normalize_text, update_text_index
+from storage_utils import ColumnarWriter, columnar_store_path, read_columnar_meta, load_columnar, load_columnar_index
+
+DATASET_PATH = "attached_assets/Dataset .csv"
+
+# Columns kept from the raw dataset
+REQUIRED_COLUMNS = [
+    'Restaurant Name', 'Cuisines', 'Address', 'City',
+    'Aggregate rating', 'Average Cost for two', 'Currency',
+    'Has Table booking', 'Has Online delivery'
+]
+
+# Optional column identifying restaurants in incremental updates
+KEY_COLUMN = 'Restaurant ID'
+
+# CSV files larger than this are streamed into a columnar store instead of
+# being parsed in one piece
+STREAMING_INGEST_BYTES = int(os.environ.get("RESTAURANT_STREAMING_INGEST_BYTES", str(512 * 1024 * 1024)))
+INGEST_CHUNK_ROWS = 100_000
+
+# Datasets up to this size get their text search index built at load; larger
+# ones build it on the first text search
+EAGER_TEXT_INDEX_ROWS = 1_000_000
+
+# Load datasets with memory-optimized dtypes (see optimize_dtypes)
+COMPACT_DTYPES = os.environ.get("RESTAURANT_COMPACT_DTYPES", "0") == "1"
+
+# Process-wide dataset cache shared by every session: (path, compact) -> entry
+_dataset_cache = {}
+_dataset_lock = threading.Lock()
+
+# Search and recommendation results keyed by normalized query and index version
+_query_cache = QueryCache(
+    max_entries=int(os.environ.get("RESTAURANT_QUERY_CACHE_ENTRIES", "1024")),
+    max_bytes=int(os.environ.get("RESTAURANT_QUERY_CACHE_BYTES", str(64 * 1024 * 1024)))
+)
+
+def _file_stat(path):
     """
-    Load and preprocess the restaurant dataset
+    Cheap file identity used to detect dataset changes between reruns
+    """
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _file_hash(path):
+    """
+    Content hash of the dataset file
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _normalize_chunk(chunk):
+    """
+    Validate and clean raw dataset rows
     """
+    # Check if all required columns exist
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+
+    # Select and clean data, keeping the restaurant key when there is one
+    key_columns = [KEY_COLUMN] if KEY_COLUMN in chunk.columns else []
+    chunk = chunk[REQUIRED_COLUMNS + key_columns].copy()
+    chunk['Cuisines'] = chunk['Cuisines'].astype(str).str.lower()
+
+    return chunk
+
+def _used_column(column):
+    return column in REQUIRED_COLUMNS or column == KEY_COLUMN
+
+def _read_dataset(path):
+    """
+    Parse the dataset file, reading only the columns used by the app
+    """
+    return _normalize_chunk(pd.read_csv(path, usecols=_used_column))
+
+def optimize_dtypes(df):
+    """
+    Return a copy of a restaurant frame using compact dtypes
+
+    Repetitive strings become categoricals, the Yes/No flags nullable
+    booleans and rating/cost float32. Names and addresses use pyarrow-backed
+    strings when pyarrow is installed, or categoricals when they repeat enough.
+    """
+    compact = df.copy()
+
+    for column in ['Cuisines', 'City', 'Currency']:
+        compact[column] = compact[column].astype('category')
+
+    for column in ['Has Table booking', 'Has Online delivery']:
+        flags = compact[column].astype(object).map({'Yes': True, 'No': False})
+        compact[column] = flags.astype('boolean')
+
+    for column in ['Aggregate rating', 'Average Cost for two']:
+        compact[column] = pd.to_numeric(compact[column], errors='coerce').astype(np.float32)
+
+    has_pyarrow = importlib.util.find_spec("pyarrow") is not None
+    for column in ['Restaurant Name', 'Address']:
+        if has_pyarrow:
+            compact[column] = compact[column].astype('string[pyarrow]')
+        elif compact[column].nunique() < 0.5 * len(compact):
+            compact[column] = compact[column].astype('category')
+
+    return compact
+
+def memory_report(before, after):
+    """
+    Bytes used per column by two representations of the same frame
+    """
+    before_bytes = before.memory_usage(deep=True, index=False)
+    after_bytes = after.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'dtype': after.dtypes.astype(str),
+        'before_bytes': before_bytes,
+        'after_bytes': after_bytes,
+        'saved_bytes': before_bytes - after_bytes
+    })
+    report.loc['Total'] = ['', before_bytes.sum(), after_bytes.sum(), before_bytes.sum() - after_bytes.sum()]
+    return report
+
+def _current_columnar_store(path, stat):
+    """
+    Columnar store directory and metadata for path if it matches the file
+    """
+    store_dir = columnar_store_path(path)
+    meta = read_columnar_meta(store_dir)
+    if meta is None or not meta.get('source') or tuple(meta['source']['stat']) != stat:
+        return None, None
+    return store_dir, meta
+
+def convert_dataset_to_columnar(path=DATASET_PATH, chunksize=INGEST_CHUNK_ROWS):
+    """
+    Convert the CSV dataset once into a memory-mappable columnar store
+
+    The CSV is streamed in chunks of required columns only, so files larger
+    than memory can be converted. load_and_process_data() then maps the
+    store instead of parsing the CSV for as long as the CSV is unchanged.
+    """
+    stat = _file_stat(path)
+    store_dir = columnar_store_path(path)
+    writer = ColumnarWriter(store_dir)
     try:
-        df = pd.read_csv("attached_assets/Dataset .csv")
+        for chunk in pd.read_csv(path, usecols=_used_column, chunksize=chunksize):
+            writer.append(_normalize_chunk(chunk))
+    except Exception:
+        writer.abort()
+        raise
+    writer.close(source={'stat': list(stat), 'hash': _file_hash(path)})
+    return store_dir
+
+def ensure_columnar_store(path=DATASET_PATH):
+    """
+    Convert the dataset to a columnar store unless a current one exists,
+    so loads memory-map it instead of parsing the CSV
+    """
+    store_dir, _ = _current_columnar_store(path, _file_stat(path))
+    return store_dir or convert_dataset_to_columnar(path)
 
-        # Define required columns
-        required_columns = [
-            'Restaurant Name', 'Cuisines', 'Address', 'City',
-            'Aggregate rating', 'Average Cost for two', 'Currency',
-            'Has Table booking', 'Has Online delivery'
-        ]
+@timed('load_and_process_data')
+def load_and_process_data(path=DATASET_PATH, compact=None):
+    """
+    Load and preprocess the restaurant dataset
 
-        # Check if all required columns exist
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+    The parsed frame is cached for the whole process and shared by every
+    session, so it must be treated as read-only. The file is only parsed
+    again when its modification time or size changes and its content hash
+    differs from the cached one. If a current columnar store was written by
+    convert_dataset_to_columnar(), it is memory-mapped instead of parsing
+    the CSV; CSV files over STREAMING_INGEST_BYTES are streamed into such a
+    store first. With compact=True (default: RESTAURANT_COMPACT_DTYPES) the
+    frame uses the dtypes from optimize_dtypes().
+    """
+    if compact is None:
+        compact = COMPACT_DTYPES
 
-        # Select and clean data
-        df = df[required_columns]
-        df['Cuisines'] = df['Cuisines'].astype(str).str.lower()
+    try:
+        stat = _file_stat(path)
 
-        return df
+        with _dataset_lock:
+            entry = _dataset_cache.get((path, compact))
+            if entry is not None and entry['stat'] == stat:
+                increment('dataset_cache.hits')
+                return entry['df']
+
+            # The file was touched: only reload if the content changed
+            store_dir, store_meta = _current_columnar_store(path, stat)
+            if store_dir is None and stat[1] > STREAMING_INGEST_BYTES:
+                convert_dataset_to_columnar(path)
+                store_dir, store_meta = _current_columnar_store(path, stat)
+            content_hash = store_meta['source']['hash'] if store_meta else _file_hash(path)
+            if entry is not None and entry['hash'] == content_hash:
+                entry['stat'] = stat
+                return entry['df']
+
+            increment('dataset_cache.loads')
+            with timer('dataset.columnar_load' if store_dir else 'dataset.csv_parse'):
+                df = load_columnar(store_dir) if store_dir else _read_dataset(path)
+            if compact:
+                with timer('dataset.optimize_dtypes'):
+                    df = optimize_dtypes(df)
+            # Build the lookup indexes up front rather than on the first query;
+            # a columnar store already holds the postings and city groups
+            with timer('index.build'):
+                if store_dir:
+                    register_restaurant_index(df, RestaurantIndex(df, load_columnar_index(store_dir)))
+                else:
+                    get_restaurant_index(df)
+            if len(df) <= EAGER_TEXT_INDEX_ROWS:
+                get_text_index(df)
+            _dataset_cache[(path, compact)] = {'stat': stat, 'hash': content_hash, 'df': df}
+            if entry is not None:
+                # Results for the replaced frame can never be hit again
+                _query_cache.clear()
+            return df
     except FileNotFoundError:
         raise FileNotFoundError("Dataset file not found. Please ensure 'Dataset .csv' exists in the attached_assets directory.")
     except Exception as e:
         raise Exception(f"Error processing data: {str(e)}")
 
-def filter_restaurants(df, cuisine_type):
+def _align_dtype(values, like):
+    """
+    Cast update values to the dtype of an existing dataset column
+    """
+    if isinstance(like.dtype, pd.CategoricalDtype):
+        return values.astype(object).astype(like.dtype)
+    if isinstance(like.dtype, pd.BooleanDtype):
+        return values.astype(object).map({'Yes': True, 'No': False, True: True, False: False}).astype('boolean')
+    if pd.api.types.is_numeric_dtype(like.dtype):
+        return pd.to_numeric(values, errors='coerce').astype(like.dtype)
+    return values.astype(like.dtype)
+
+@timed('apply_dataset_updates')
+def apply_dataset_updates(updates, path=DATASET_PATH, compact=None):
+    """
+    Apply a delta of new, changed or closed restaurants to the loaded dataset
+
+    updates is a frame (or CSV path) keyed by 'Restaurant ID'. Rows with a
+    truthy 'Closed' column are removed from search and recommendations
+    until a later row for them gives a falsy 'Closed' (rows without one
+    leave a closed restaurant closed),
+    rows with a known ID replace the values they give (missing cells keep
+    the restaurant's current value) and rows with an unknown ID are
+    appended (they need every required column).
+    The cached frame and its indexes (including any text search and
+    similarity index already built) are carried over instead of reloading
+    the file, and the result replaces the cached frame for every session. The
+    changes live in memory until the dataset file itself changes.
+    Returns the updated frame.
+    """
+    if compact is None:
+        compact = COMPACT_DTYPES
+    if isinstance(updates, str):
+        updates = pd.read_csv(updates)
+
+    df = load_and_process_data(path, compact)
+    if KEY_COLUMN not in df.columns or KEY_COLUMN not in updates.columns:
+        raise ValueError(f"Updates need a '{KEY_COLUMN}' column in both the dataset and the delta")
+
+    updates = updates.drop_duplicates(KEY_COLUMN, keep='last').reset_index(drop=True)
+    if 'Cuisines' in updates.columns:
+        updates['Cuisines'] = updates['Cuisines'].astype(str).str.lower()
+    if 'Closed' in updates.columns:
+        closing = updates['Closed'].astype(object).isin(['Yes', 'yes', True, 1, '1', 'true', 'True']).to_numpy()
+        opening = updates['Closed'].notna().to_numpy() & ~closing
+    else:
+        closing = opening = np.zeros(len(updates), dtype=bool)
+
+    with _dataset_lock:
+        entry = _dataset_cache[(path, compact)]
+        df = entry['df']
+
+        # Position of each update's restaurant in the frame, -1 for new ones
+        positions_by_key = pd.Series(np.arange(len(df)), index=df[KEY_COLUMN].to_numpy())
+        positions_by_key = positions_by_key[~positions_by_key.index.duplicated(keep='last')]
+        positions = positions_by_key.reindex(updates[KEY_COLUMN].to_numpy()).fillna(-1).to_numpy(dtype=np.int64)
+
+        closed = positions[closing & (positions >= 0)]
+        reopened = positions[opening & (positions >= 0)]
+        changed_mask = ~closing & (positions >= 0)
+        changed = positions[changed_mask]
+        new_rows = updates[~closing & (positions < 0)]
+
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in new_rows.columns]
+        if len(new_rows) and missing_columns:
+            raise ValueError(f"New restaurants are missing required columns: {', '.join(missing_columns)}")
+
+        patched = df.copy()
+        update_columns = [col for col in df.columns if col in updates.columns and col != KEY_COLUMN]
+        for column in update_columns:
+            # Records in one delta may carry different fields, so a changed
+            # restaurant only takes the values its own record gives
+            values = updates.loc[changed_mask, column]
+            given = values.notna().to_numpy()
+            values = values[given]
+            if isinstance(patched[column].dtype, pd.CategoricalDtype):
+                new_categories = pd.Index(pd.concat([values, new_rows[column]]).dropna().unique())
+                new_categories = new_categories.difference(patched[column].cat.categories)
+                patched[column] = patched[column].cat.add_categories(new_categories)
+            if given.any():
+                patched.iloc[changed[given], patched.columns.get_loc(column)] = _align_dtype(values, patched[column]).to_numpy()
+
+        if len(new_rows):
+            appended = pd.DataFrame(
+                {column: _align_dtype(new_rows[column], patched[column]) for column in df.columns}
+            )
+            patched = pd.concat([patched, appended], ignore_index=True)
+
+        # Patch the indexes instead of rebuilding them from scratch
+        previous = get_restaurant_index(df)
+        index = previous.updated(patched, changed, closed, reopened)
+        register_restaurant_index(patched, index)
+        touched = np.union1d(np.union1d(changed, reopened), np.arange(len(df), len(patched)))
+        update_text_index(patched, previous, index, touched)
+        update_similarity_index(patched, previous, index)
+
+        entry['df'] = patched
+        _query_cache.clear()
+        return patched
+
+def clear_dataset_cache():
+    """
+    Drop every cached dataset so the next load parses the file again
+    """
+    with _dataset_lock:
+        _dataset_cache.clear()
+        _query_cache.clear()
+
+def clear_query_cache():
+    """
+    Drop every cached search and recommendation result
+    """
+    _query_cache.clear()
+
+def get_query_cache_stats():
+    """
+    Hit/miss counters and size of the shared query result cache
+    """
+    return _query_cache.stats()
+
+def get_dataset_metadata(df):
     """
-    Filter restaurants based on cuisine type
+    Precomputed dataset statistics: cuisine vocabulary and counts, city
+    counts and rating/cost histograms
     """
-    cuisine_type = cuisine_type.lower()
-    filtered_df = df[df["Cuisines"].str.contains(cuisine_type, case=False, na=False)]
+    return get_restaurant_index(df).metadata
 
-    if filtered_df.empty:
+# Star labels by rounded rating
+_STAR_LABELS = np.array(['⭐' * n for n in range(11)], dtype=object)
+
+def autocomplete(df, field, prefix='', limit=10):
+    """
+    Suggestions for a cuisine or city being typed, most common first
+
+    Returns up to limit dicts with the value and its number of restaurants;
+    with an empty prefix and limit=None, every value by popularity.
+    """
+    prefixes = get_restaurant_index(df).metadata['autocomplete']
+    if field not in prefixes:
+        raise ValueError(f"Unknown autocomplete field '{field}', expected one of {', '.join(prefixes)}")
+    return [
+        {'value': value, 'restaurants': count}
+        for value, count in prefixes[field].suggest(prefix, limit)
+    ]
+
+def _format_cost(currencies, costs):
+    """
+    Cost labels like 'Dollar($) 25.00', formatting each distinct
+    (currency, cost) pair only once
+    """
+    currency_codes, currency_values = pd.factorize(currencies, use_na_sentinel=False)
+    cost_codes, cost_values = pd.factorize(costs, use_na_sentinel=False)
+    n_costs = max(len(cost_values), 1)
+    pair_codes, pairs = pd.factorize(currency_codes * n_costs + cost_codes)
+
+    labels = np.array([
+        f"{currency_values[pair // n_costs]} {cost_values[pair % n_costs]:.2f}"
+        for pair in pairs
+    ], dtype=object)
+    return labels.take(pair_codes)
+
+def _format_rating(ratings):
+    """
+    Star labels for ratings, 'Not rated' where the rating is missing
+    """
+    ratings = pd.to_numeric(ratings, errors='coerce').to_numpy(dtype=np.float64)
+    missing = np.isnan(ratings)
+    stars = np.clip(np.rint(np.where(missing, 0, ratings)), 0, len(_STAR_LABELS) - 1).astype(np.intp)
+    return np.where(missing, "Not rated", _STAR_LABELS.take(stars))
+
+@timed('format')
+def _format_display(rows):
+    """
+    Add the display Cost and Rating columns to a frame of restaurants
+    """
+    rows['Cost'] = _format_cost(rows['Currency'].to_numpy(dtype=object), rows['Average Cost for two'].to_numpy())
+    rows['Rating'] = _format_rating(rows['Aggregate rating'])
+    return rows
+
+# Sort orders for search results: key -> (index array, descending)
+SEARCH_SORT_KEYS = {
+    'rating': ('ratings', True),
+    'cost': ('costs', False)
+}
+
+def _search_scope(index, city):
+    """
+    The whole index, or only the partition of city when one is given
+    """
+    return index.for_city(city) if city else index
+
+def _search_rows(df, cuisine_type, sort_by=None, city=None):
+    """
+    Row positions matching a cuisine search in result order, cached
+    """
+    if sort_by is not None and sort_by not in SEARCH_SORT_KEYS:
+        raise ValueError(f"Unknown sort key '{sort_by}', expected one of {', '.join(SEARCH_SORT_KEYS)}")
+
+    index = get_restaurant_index(df)
+    cuisine_type = cuisine_type.strip().lower()
+    city = city.strip().lower() if city else None
+
+    def compute():
+        with timer('search.lookup'):
+            rows = _search_scope(index, city).rows_for_cuisine(cuisine_type)
+            if sort_by is not None:
+                attribute, descending = SEARCH_SORT_KEYS[sort_by]
+                values = getattr(index, attribute)[rows]
+                # Stable on row position; missing values sort last either way
+                rows = rows[np.lexsort((rows, -values if descending else values))]
+            return rows
+
+    return _query_cache.get_or_compute(('search', index.version, cuisine_type, sort_by, city), compute)
+
+class SearchResults:
+    """
+    Cursor over the restaurants matching a search
+
+    Only the matching row positions are kept; rows are copied and formatted
+    one page at a time.
+    """
+    def __init__(self, df, rows, page_size=50, sort_by=None):
+        self.df = df
+        self.rows = rows
+        self.page_size = max(int(page_size), 1)
+        self.sort_by = sort_by
+        self.total = len(rows)
+
+    @property
+    def n_pages(self):
+        return max(-(-self.total // self.page_size), 1)
+
+    def page(self, number):
+        """
+        Formatted display rows of a page, numbered from 0
+        """
+        start = number * self.page_size
+        positions = self.rows[start:start + self.page_size]
+        display_df = _format_display(self.df.iloc[positions].copy())
+        return display_df[["Restaurant Name", "Cuisines", "Address", "Cost", "Rating"]]
+
+@timed('text_search_restaurants')
+def text_search_restaurants(df, query, page_size=50, city=None):
+    """
+    Free-text search over restaurant names, cuisines and addresses,
+    tolerant of typos and unfinished words, returning a SearchResults
+    cursor ranked by relevance (see TextSearchIndex)
+    """
+    index = get_restaurant_index(df)
+    normalized = ' '.join(normalize_text(query))
+    city = city.strip().lower() if city else None
+
+    def compute():
+        with timer('text_search.lookup'):
+            rows = index.for_city(city).rows if city else None
+            return get_text_index(df).search(normalized, rows)[0]
+
+    rows = _query_cache.get_or_compute(('text', index.version, normalized, city), compute)
+    return SearchResults(df, rows, page_size=page_size)
+
+@timed('search_restaurants')
+def search_restaurants(df, cuisine_type, page_size=50, sort_by=None, city=None):
+    """
+    Search restaurants serving exactly the given cuisine type, optionally
+    only in one city, returning a paginated SearchResults cursor
+    """
+    rows = _search_rows(df, cuisine_type, sort_by, city)
+    return SearchResults(df, rows, page_size=page_size, sort_by=sort_by)
+
+def _cached_display(key, compute):
+    """
+    Formatted result frame cached under key; each caller gets its own copy
+    so the cached frame is never modified
+    """
+    return _query_cache.get_or_compute(key, compute).copy()
+
+@timed('filter_restaurants')
+def filter_restaurants(df, cuisine_type, city=None):
+    """
+    Filter restaurants serving exactly the given cuisine type, optionally
+    only in one city
+    """
+    cuisine_type = cuisine_type.strip().lower()
+    rows = _search_rows(df, cuisine_type, city=city)
+
+    if len(rows) == 0:
+        if city:
+            return f"No restaurants found serving {cuisine_type} cuisine in {city}."
         return f"No restaurants found serving {cuisine_type} cuisine."
 
-    # Format the display data
-    display_df = filtered_df.copy()
-    display_df['Cost'] = display_df.apply(
-        lambda x: f"{x['Currency']} {x['Average Cost for two']:.2f}", axis=1
-    )
-    display_df['Rating'] = display_df['Aggregate rating'].apply(
-        lambda x: f"{'⭐' * int(round(x))}" if pd.notnull(x) else "Not rated"
-    )
+    def compute():
+        # Format the display data
+        display_df = _format_display(df.iloc[rows].copy())
 
-    # Select and rename columns for display
-    return display_df[["Restaurant Name", "Cuisines", "Address", "Cost", "Rating"]]
+        # Select and rename columns for display
+        return display_df[["Restaurant Name", "Cuisines", "Address", "Cost", "Rating"]]
 
+    index = get_restaurant_index(df)
+    return _cached_display(('filter', index.version, cuisine_type, city.strip().lower() if city else None), compute)
+
+def _preference_terms(preferences):
+    """
+    Normalized (cuisines, max_budget, min_rating, city) of a preferences
+    dict; raises ValueError for values of the wrong type
+    """
+    cuisines = preferences['preferred_cuisines']
+    if isinstance(cuisines, str) or not all(isinstance(c, str) for c in cuisines):
+        raise ValueError("'preferred_cuisines' must be a list of strings")
+    city = preferences.get('city')
+    if city is not None and not isinstance(city, str):
+        raise ValueError("'city' must be a string")
+
+    terms = []
+    for name, default in [('max_budget', float('inf')), ('min_rating', 0)]:
+        value = preferences.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float, np.number)):
+            raise ValueError(f"'{name}' must be a number")
+        terms.append(float(value))
+
+    return (
+        sorted(c.strip().lower() for c in cuisines), terms[0], terms[1],
+        city.strip().lower() if city else None
+    )
+
+@timed('get_restaurant_recommendations')
 def get_restaurant_recommendations(df, preferences):
     """
     Get restaurant recommendations based on user preferences
+
+    With a 'city' preference only restaurants in that city are scored.
+    """
+    try:
+        index = get_restaurant_index(df)
+        preferred_cuisines, max_budget, min_rating, city = _preference_terms(preferences)
+
+        def compute():
+            # Score every restaurant in scope with array operations on the prebuilt index
+            with timer('recommend.scoring'):
+                scope = _search_scope(index, city)
+                scores = scope.recommendation_scores(
+                    preferred_cuisines, max_budget=max_budget, min_rating=min_rating
+                )
+                top_rows = scope.frame_positions(top_k_positions(scores, 10))
+
+            # Select the top recommendations without copying the whole frame
+            recommendations = df.iloc[top_rows].copy()
+
+            # Format display data
+            recommendations = _format_display(recommendations)
+
+            return recommendations[["Restaurant Name", "Cuisines", "Address", "Cost", "Rating"]]
+
+        key = ('recommend', index.version, tuple(preferred_cuisines), max_budget, min_rating, city)
+        return _cached_display(key, compute)
+
+    except ValueError:
+        # Bad input, reported as such rather than as a failure
+        raise
+    except Exception as e:
+        raise Exception(f"Error generating recommendations: {str(e)}")
+
+@timed('get_batch_recommendations')
+def get_batch_recommendations(df, profiles, top_k=10):
+    """
+    Get recommendations for many preference profiles in one call
+
+    Each profile is a preferences dict as accepted by
+    get_restaurant_recommendations(). Profiles are grouped by city and each
+    group is ranked against its city partition, sharing the rating and
+    budget scoring between profiles (see _ScoringIndex.batch_top_k).
+    Returns one frame with a Profile column (position in profiles) and a
+    Rank column, top_k rows per profile.
     """
     try:
-        # Create a scoring system
-        scored_df = df.copy()
-        scored_df['score'] = 0.0
+        index = get_restaurant_index(df)
+
+        # Profile positions per city, None for profiles without one
+        by_city = {}
+        for position, profile in enumerate(profiles):
+            city = _preference_terms(profile)[3]
+            by_city.setdefault(city, []).append(position)
 
-        # Score based on cuisine preferences (30% weight)
-        for cuisine in preferences['preferred_cuisines']:
-            cuisine = cuisine.lower()
-            scored_df['score'] += scored_df['Cuisines'].str.contains(cuisine, case=False, na=False) * 30
+        results = [None] * len(profiles)
+        with timer('recommend.batch_scoring'):
+            for city, members in by_city.items():
+                scope = _search_scope(index, city)
+                tops = scope.batch_top_k([profiles[p] for p in members], top_k)
+                for position, top in zip(members, tops):
+                    results[position] = scope.frame_positions(top)
 
-        # Score based on rating (40% weight)
-        min_rating = preferences.get('min_rating', 0)
-        scored_df['score'] += (scored_df['Aggregate rating'] - min_rating) * 8
+        profile_ids, ranks, positions = [], [], []
+        for position, top_rows in enumerate(results):
+            profile_ids.append(np.full(len(top_rows), position))
+            ranks.append(np.arange(1, len(top_rows) + 1))
+            positions.append(top_rows)
 
-        # Score based on budget (30% weight)
-        max_budget = preferences.get('max_budget', float('inf'))
-        budget_score = 30 * (1 - scored_df['Average Cost for two'] / (max_budget * 2))
-        scored_df['score'] += budget_score.clip(lower=0)
+        if not positions:
+            positions = profile_ids = ranks = [np.empty(0, dtype=np.int64)]
+
+        recommendations = df.iloc[np.concatenate(positions)].copy()
+        recommendations.insert(0, 'Profile', np.concatenate(profile_ids))
+        recommendations.insert(1, 'Rank', np.concatenate(ranks))
+        recommendations = _format_display(recommendations)
+
+        return recommendations[["Profile", "Rank", "Restaurant Name", "Cuisines", "Address", "Cost", "Rating"]]
+
+    except ValueError:
+        # Bad input, reported as such rather than as a failure
+        raise
+    except Exception as e:
+        raise Exception(f"Error generating batch recommendations: {str(e)}")
+
+@timed('get_similar_restaurants')
+def get_similar_restaurants(df, position, top_k=10, same_city=False):
+    """
+    Restaurants most like the one at row position, by cosine similarity of
+    their cuisines, city, cost, rating and services (see SimilarityIndex)
+
+    With same_city=True only restaurants in the same city are compared.
+    Returns the display columns plus a Similarity column from 0 to 1.
+    """
+    try:
+        index = get_restaurant_index(df)
+        position = int(position)
+        if not 0 <= position < len(df):
+            raise ValueError(f"No restaurant at position {position}")
 
-        # Sort by score and get top recommendations
-        recommendations = scored_df.nlargest(10, 'score')
+        def compute():
+            with timer('similar.scoring'):
+                rows = index.for_city(df['City'].iloc[position]).rows if same_city else None
+                scores = get_similarity_index(df).scores([position], rows)[0]
+                top = top_k_positions(scores, top_k)
+                top_rows = top if rows is None else rows[top]
 
-        # Format display data
-        recommendations['Cost'] = recommendations.apply(
-            lambda x: f"{x['Currency']} {x['Average Cost for two']:.2f}", axis=1
-        )
-        recommendations['Rating'] = recommendations['Aggregate rating'].apply(
-            lambda x: f"{'⭐' * int(round(x))}" if pd.notnull(x) else "Not rated"
-        )
+            similar = _format_display(df.iloc[top_rows].copy())
+            similar['Similarity'] = np.round(np.clip(scores[top], 0, 1), 3)
+            return similar[["Restaurant Name", "Cuisines", "Address", "Cost", "Rating", "Similarity"]]
 
-        return recommendations[["Restaurant Name", "Cuisines", "Address", "Cost", "Rating"]]
+        key = ('similar', index.version, position, top_k, same_city)
+        return _cached_display(key, compute)
 
+    except ValueError:
+        # Bad input, reported as such rather than as a failure
+        raise
     except Exception as e:
-        raise Exception(f"Error generating recommendations: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error finding similar restaurants: {str(e)}")